@@ -0,0 +1,213 @@
+from __future__ import annotations
+from typing import Any
+
+from ._record import THREAD_TYPES
+from ..type.channel import Channel
+from ..type.gateway import ReceiveEvent
+from ..type.guild import GuildMember
+from ..type.voice import VoiceState
+
+
+class StateIndex:
+    """Secondary indexes over cached guild state, maintained incrementally from gateway dispatch
+    events
+
+    Indexes channels by parent (category), threads by parent channel, members by role and voice
+    states by channel, so lookups only cost as much as their result.
+    """
+
+    def __init__(self):
+        self.__channel_parents: dict[int, tuple[int | None, bool]] = {}
+        self.__children: dict[int, set[int]] = {}
+        self.__guild_channels: dict[int, set[int]] = {}
+        self.__member_roles: dict[int, dict[int, tuple[int, ...]]] = {}
+        self.__role_members: dict[int, dict[int, set[int]]] = {}
+        self.__threads: dict[int, set[int]] = {}
+        self.__voice_channels: dict[int, dict[int, int]] = {}
+        self.__voice_members: dict[int, set[int]] = {}
+
+    def _add_channel(self, channel: Channel, guild_id: int | None = None):
+        channel_id = int(channel["id"])
+        parent_id = channel.get("parent_id")
+        parent_id = int(parent_id) if parent_id is not None else None
+        is_thread = channel["type"] in THREAD_TYPES
+
+        if self.__channel_parents.get(channel_id) == (parent_id, is_thread):
+            return
+
+        self._remove_channel(channel_id)
+        self.__channel_parents[channel_id] = (parent_id, is_thread)
+
+        if parent_id is not None:
+            index = self.__threads if is_thread else self.__children
+            index.setdefault(parent_id, set()).add(channel_id)
+
+        if "guild_id" in channel:
+            guild_id = int(channel["guild_id"])
+
+        if guild_id is not None:
+            self.__guild_channels.setdefault(guild_id, set()).add(channel_id)
+
+    def _add_member(self, guild_id: int, member: GuildMember):
+        user_id = int(member["user"]["id"])
+        roles = tuple(map(int, member["roles"]))
+        member_roles = self.__member_roles.setdefault(guild_id, {})
+        old_roles = member_roles.get(user_id, ())
+
+        if roles == old_roles:
+            return
+
+        role_members = self.__role_members.setdefault(guild_id, {})
+
+        for role_id in set(old_roles).difference(roles):
+            self._discard(role_members, role_id, user_id)
+
+        for role_id in set(roles).difference(old_roles):
+            role_members.setdefault(role_id, set()).add(user_id)
+
+        member_roles[user_id] = roles
+
+    def _add_voice_state(self, guild_id: int, voice_state: VoiceState):
+        user_id = int(voice_state["user_id"])
+        channel_id = voice_state["channel_id"]
+        voice_channels = self.__voice_channels.setdefault(guild_id, {})
+        old_channel_id = voice_channels.pop(user_id, None)
+
+        if old_channel_id is not None:
+            self._discard(self.__voice_members, old_channel_id, user_id)
+
+        if channel_id is not None:
+            voice_channels[user_id] = int(channel_id)
+            self.__voice_members.setdefault(int(channel_id), set()).add(user_id)
+
+    @staticmethod
+    def _discard(index: dict[int, set[int]], key: int, value: int):
+        values = index.get(key)
+
+        if values is not None:
+            values.discard(value)
+
+            if not values:
+                del index[key]
+
+    def _remove_channel(self, channel_id: int):
+        parent = self.__channel_parents.pop(channel_id, None)
+
+        if parent is not None and parent[0] is not None:
+            self._discard(self.__threads if parent[1] else self.__children, parent[0],
+                          channel_id)
+
+    def _remove_guild(self, guild_id: int, keep_voice: bool = False):
+        for channel_id in self.__guild_channels.pop(guild_id, set()):
+            self._remove_channel(channel_id)
+
+        self.__member_roles.pop(guild_id, None)
+        self.__role_members.pop(guild_id, None)
+
+        if keep_voice:
+            return
+
+        # Voice states are keyed by guild, channels created later are cleared as well
+        for user_id, channel_id in self.__voice_channels.pop(guild_id, {}).items():
+            self._discard(self.__voice_members, channel_id, user_id)
+
+    def _remove_member(self, guild_id: int, user_id: int):
+        roles = self.__member_roles.get(guild_id, {}).pop(user_id, ())
+        role_members = self.__role_members.get(guild_id, {})
+
+        for role_id in roles:
+            self._discard(role_members, role_id, user_id)
+
+    def channels_in(self, parent_id: int):
+        """IDs of (non thread) channels whose parent is `parent_id`, e.g. a category's channels"""
+        return set(self.__children.get(parent_id, ()))
+
+    def handle(self, event: ReceiveEvent | str, data: Any):
+        """Update indexes from gateway dispatch event"""
+        if event == ReceiveEvent.READY:
+            # New session, guilds are sent again by GUILD_CREATE
+            self.__channel_parents.clear()
+            self.__children.clear()
+            self.__guild_channels.clear()
+            self.__member_roles.clear()
+            self.__role_members.clear()
+            self.__threads.clear()
+            self.__voice_channels.clear()
+            self.__voice_members.clear()
+
+        elif event == ReceiveEvent.GUILD_CREATE:
+            guild_id = int(data["id"])
+
+            if data.get("unavailable"):
+                return
+
+            self._remove_guild(guild_id)
+
+            for channel in data.get("channels", []) + data.get("threads", []):
+                self._add_channel(channel, guild_id=guild_id)
+
+            for member in data.get("members", []):
+                self._add_member(guild_id, member)
+
+            for voice_state in data.get("voice_states", []):
+                self._add_voice_state(guild_id, voice_state)
+
+        elif event == ReceiveEvent.GUILD_DELETE:
+            # Members stay connected through outages, GUILD_CREATE replaces their voice states
+            self._remove_guild(int(data["id"]), keep_voice=bool(data.get("unavailable")))
+
+        elif event in (ReceiveEvent.CHANNEL_CREATE, ReceiveEvent.CHANNEL_UPDATE,
+                       ReceiveEvent.THREAD_CREATE, ReceiveEvent.THREAD_UPDATE):
+            self._add_channel(data)
+
+        elif event in (ReceiveEvent.CHANNEL_DELETE, ReceiveEvent.THREAD_DELETE):
+            channel_id = int(data["id"])
+            self._remove_channel(channel_id)
+
+            if "guild_id" in data:
+                self.__guild_channels.get(int(data["guild_id"]), set()).discard(channel_id)
+
+        elif event == ReceiveEvent.THREAD_LIST_SYNC:
+            for thread in data["threads"]:
+                self._add_channel(thread)
+
+        elif event in (ReceiveEvent.GUILD_MEMBER_ADD, ReceiveEvent.GUILD_MEMBER_UPDATE):
+            self._add_member(int(data["guild_id"]), data)
+
+        elif event == ReceiveEvent.GUILD_MEMBER_REMOVE:
+            self._remove_member(int(data["guild_id"]), int(data["user"]["id"]))
+
+        elif event == ReceiveEvent.GUILD_MEMBERS_CHUNK:
+            guild_id = int(data["guild_id"])
+
+            for member in data["members"]:
+                self._add_member(guild_id, member)
+
+        elif event == ReceiveEvent.GUILD_ROLE_DELETE:
+            guild_id = int(data["guild_id"])
+            role_id = int(data["role_id"])
+            member_roles = self.__member_roles.get(guild_id, {})
+
+            for user_id in self.__role_members.get(guild_id, {}).pop(role_id, set()):
+                member_roles[user_id] = tuple(role for role in member_roles[user_id]
+                                              if role != role_id)
+
+        elif event == ReceiveEvent.VOICE_STATE_UPDATE:
+            if "guild_id" in data:
+                self._add_voice_state(int(data["guild_id"]), data)
+
+    def members_with_role(self, guild_id: int, role_id: int):
+        """IDs of cached members of guild having role"""
+        return set(self.__role_members.get(guild_id, {}).get(role_id, ()))
+
+    def threads_of(self, parent_id: int):
+        """IDs of cached threads created in channel"""
+        return set(self.__threads.get(parent_id, ()))
+
+    def voice_channel_of(self, guild_id: int, user_id: int):
+        """ID of voice channel user is connected to in guild, None if not connected"""
+        return self.__voice_channels.get(guild_id, {}).get(user_id)
+
+    def voice_members(self, channel_id: int):
+        """IDs of users connected to voice channel"""
+        return set(self.__voice_members.get(channel_id, ()))
@@ -0,0 +1,279 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from itertools import compress
+from typing import Any, Iterable
+
+from ..type.gateway import ReceiveEvent
+from ..type.guild import GuildMember
+
+
+class MemberColumns:
+    """Columnar store of a single guild's members
+
+    Members are stored as parallel arrays sorted by user ID (user IDs, join timestamps, flags)
+    plus CSR style role arrays, one mapping members to their roles and one mapping roles to their
+    members. Changes are collected in an overlay which is merged into the arrays once it grows
+    past `compact_threshold` members or an eighth of the guild, whichever is larger, so updates
+    don't have to shift the arrays every time and loading a guild chunk by chunk only compacts a
+    logarithmic number of times.
+    """
+
+    def __init__(self, compact_threshold: int = 1024):
+        self.__compact_threshold = compact_threshold
+        self.__flags = array("L")
+        self.__joined_at = array("d")
+        self.__joined_order = array("L")
+        self.__member_role_ids = array("Q")
+        self.__member_role_offsets = array("L", [0])
+        self.__overlay: dict[int, tuple[float, int, tuple[int, ...]] | None] = {}
+        self.__role_keys = array("Q")
+        self.__role_member_offsets = array("L", [0])
+        self.__role_member_rows = array("L")
+        self.__user_ids = array("Q")
+
+    def __contains__(self, user_id: int):
+        if user_id in self.__overlay:
+            return self.__overlay[user_id] is not None
+
+        return self._row(user_id) is not None
+
+    def __iter__(self):
+        return iter(self.user_ids())
+
+    def __len__(self):
+        return len(self.user_ids())
+
+    def _columns(self, user_id: int, member: GuildMember):
+        old = self._columns_of(user_id)
+        joined_at = member.get("joined_at")
+        flags = member.get("flags")
+
+        # Member updates may lack the join time and flags, keep the stored values for them
+        if joined_at is not None:
+            joined_at = datetime.fromisoformat(joined_at).timestamp()
+
+        elif old is not None:
+            joined_at = old[0]
+
+        else:
+            joined_at = 0.0
+
+        if flags is None:
+            flags = old[1] if old is not None else 0
+
+        return joined_at, flags, tuple(map(int, member["roles"]))
+
+    def _columns_of(self, user_id: int):
+        if user_id in self.__overlay:
+            return self.__overlay[user_id]
+
+        row = self._row(user_id)
+
+        if row is None:
+            return None
+
+        start = self.__member_role_offsets[row]
+        end = self.__member_role_offsets[row + 1]
+        return (self.__joined_at[row], self.__flags[row],
+                tuple(self.__member_role_ids[start:end]))
+
+    def _compact_if_needed(self):
+        if len(self.__overlay) > max(self.__compact_threshold, len(self.__user_ids) // 8):
+            self.compact()
+
+    def _live_rows(self, rows: Iterable[int]):
+        """User IDs of base rows which aren't overridden by the overlay"""
+        user_ids = self.__user_ids
+        overlay = self.__overlay
+        return [user_ids[row] for row in rows if user_ids[row] not in overlay]
+
+    def _row(self, user_id: int):
+        row = bisect_left(self.__user_ids, user_id)
+
+        if row < len(self.__user_ids) and self.__user_ids[row] == user_id:
+            return row
+
+        return None
+
+    def compact(self):
+        """Merge overlay into the column arrays and rebuild the role and join time indexes"""
+        members: dict[int, tuple[float, int, tuple[int, ...]]] = {}
+
+        for row, user_id in enumerate(self.__user_ids):
+            start = self.__member_role_offsets[row]
+            end = self.__member_role_offsets[row + 1]
+            members[user_id] = (self.__joined_at[row], self.__flags[row],
+                                tuple(self.__member_role_ids[start:end]))
+
+        for user_id, columns in self.__overlay.items():
+            if columns is None:
+                members.pop(user_id, None)
+
+            else:
+                members[user_id] = columns
+
+        user_ids = sorted(members)
+        self.__user_ids = array("Q", user_ids)
+        self.__joined_at = array("d", (members[user_id][0] for user_id in user_ids))
+        self.__flags = array("L", (members[user_id][1] for user_id in user_ids))
+        self.__member_role_ids = array("Q")
+        self.__member_role_offsets = array("L", [0])
+        role_rows: dict[int, list[int]] = {}
+
+        for row, user_id in enumerate(user_ids):
+            roles = members[user_id][2]
+            self.__member_role_ids.extend(roles)
+            self.__member_role_offsets.append(len(self.__member_role_ids))
+
+            for role_id in roles:
+                role_rows.setdefault(role_id, []).append(row)
+
+        self.__role_keys = array("Q", sorted(role_rows))
+        self.__role_member_offsets = array("L", [0])
+        self.__role_member_rows = array("L")
+
+        for role_id in self.__role_keys:
+            self.__role_member_rows.extend(role_rows[role_id])
+            self.__role_member_offsets.append(len(self.__role_member_rows))
+
+        joined_at = self.__joined_at
+        self.__joined_order = array("L", sorted(range(len(user_ids)),
+                                                key=joined_at.__getitem__))
+        self.__overlay.clear()
+
+    def joined_between(self, after: datetime | float | None = None,
+                       before: datetime | float | None = None):
+        """User IDs of members who joined after / before a datetime or UNIX timestamp"""
+        if isinstance(after, datetime):
+            after = after.timestamp()
+
+        if isinstance(before, datetime):
+            before = before.timestamp()
+
+        joined_at = self.__joined_at.__getitem__
+        order = self.__joined_order
+        start = bisect_right(order, after, key=joined_at) if after is not None else 0
+        end = bisect_left(order, before, key=joined_at) if before is not None else len(order)
+        user_ids = self._live_rows(order[start:end])
+
+        for user_id, columns in self.__overlay.items():
+            if columns is not None and (after is None or columns[0] > after) and \
+                    (before is None or columns[0] < before):
+                user_ids.append(user_id)
+
+        return user_ids
+
+    def remove(self, user_id: int):
+        self.__overlay[user_id] = None
+        self._compact_if_needed()
+
+    def remove_role(self, role_id: int):
+        """Remove deleted role from all members"""
+        for user_id in self.with_role(role_id):
+            joined_at, flags, roles = self._columns_of(user_id)
+            self.__overlay[user_id] = (joined_at, flags,
+                                       tuple(role for role in roles if role != role_id))
+
+        self.compact()
+
+    def roles(self, user_id: int):
+        columns = self._columns_of(user_id)
+        return columns[2] if columns is not None else None
+
+    def update(self, user_id: int, member: GuildMember):
+        """Add or replace member"""
+        self.__overlay[user_id] = self._columns(user_id, member)
+        self._compact_if_needed()
+
+    def update_many(self, members: Iterable[GuildMember]):
+        """Add or replace many members (e.g. from GUILD_CREATE or GUILD_MEMBERS_CHUNK), compacting
+        at most once"""
+        for member in members:
+            user_id = int(member["user"]["id"])
+            self.__overlay[user_id] = self._columns(user_id, member)
+
+        self._compact_if_needed()
+
+    def user_ids(self):
+        user_ids = self._live_rows(range(len(self.__user_ids)))
+        user_ids.extend(user_id for user_id, columns in self.__overlay.items()
+                        if columns is not None)
+        return user_ids
+
+    def with_flags(self, flags: int):
+        """User IDs of members having all of `flags` set"""
+        user_ids = [user_id for user_id in compress(self.__user_ids,
+                                                    (member_flags & flags == flags
+                                                     for member_flags in self.__flags))
+                    if user_id not in self.__overlay]
+        user_ids.extend(user_id for user_id, columns in self.__overlay.items()
+                        if columns is not None and columns[1] & flags == flags)
+        return user_ids
+
+    def with_role(self, role_id: int):
+        """User IDs of members having role"""
+        index = bisect_left(self.__role_keys, role_id)
+
+        if index < len(self.__role_keys) and self.__role_keys[index] == role_id:
+            start = self.__role_member_offsets[index]
+            end = self.__role_member_offsets[index + 1]
+            user_ids = self._live_rows(self.__role_member_rows[start:end])
+
+        else:
+            user_ids = []
+
+        user_ids.extend(user_id for user_id, columns in self.__overlay.items()
+                        if columns is not None and role_id in columns[2])
+        return user_ids
+
+
+class MemberStore:
+    """Columnar member stores of all guilds, built from gateway dispatch events
+
+    Alternative to caching members as `GuildMemberRecord`s in `State` for very large guilds,
+    create `State` with `cache_members=False` when using it.
+    """
+
+    def __init__(self, compact_threshold: int = 1024):
+        self.__compact_threshold = compact_threshold
+        self.__guilds: dict[int, MemberColumns] = {}
+
+    def guild(self, guild_id: int):
+        return self.__guilds.get(guild_id)
+
+    def handle(self, event: ReceiveEvent | str, data: Any):
+        """Update member stores from gateway dispatch event"""
+        if event == ReceiveEvent.GUILD_CREATE:
+            if not data.get("unavailable"):
+                columns = MemberColumns(self.__compact_threshold)
+                columns.update_many(data.get("members", []))
+                self.__guilds[int(data["id"])] = columns
+
+        elif event == ReceiveEvent.GUILD_DELETE:
+            self.__guilds.pop(int(data["id"]), None)
+
+        elif event == ReceiveEvent.GUILD_MEMBERS_CHUNK:
+            columns = self.__guilds.get(int(data["guild_id"]))
+
+            if columns is not None:
+                columns.update_many(data["members"])
+
+        elif event in (ReceiveEvent.GUILD_MEMBER_ADD, ReceiveEvent.GUILD_MEMBER_UPDATE):
+            columns = self.__guilds.get(int(data["guild_id"]))
+
+            if columns is not None:
+                columns.update(int(data["user"]["id"]), data)
+
+        elif event == ReceiveEvent.GUILD_MEMBER_REMOVE:
+            columns = self.__guilds.get(int(data["guild_id"]))
+
+            if columns is not None:
+                columns.remove(int(data["user"]["id"]))
+
+        elif event == ReceiveEvent.GUILD_ROLE_DELETE:
+            columns = self.__guilds.get(int(data["guild_id"]))
+
+            if columns is not None:
+                columns.remove_role(int(data["role_id"]))
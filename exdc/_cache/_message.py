@@ -0,0 +1,170 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime
+from time import monotonic
+from typing import Any
+
+from ..snowflake import from_datetime
+from ..type.channel import Message
+from ..type.gateway import ReceiveEvent
+
+
+class MessageCache:
+    """Bounded cache of recent messages built from MESSAGE_* dispatch events
+
+    Messages are evicted least recently used first once `max_messages` is exceeded, oldest first
+    from a channel once `max_per_channel` is exceeded for it, and once they haven't been created
+    or updated for `ttl` seconds. Each channel keeps a snowflake ordered timeline of its cached
+    message IDs for range lookups.
+    """
+
+    def __init__(self, max_messages: int = 10000, max_per_channel: int | None = None,
+                 ttl: float | None = None):
+        self.__max_messages = max_messages
+        self.__max_per_channel = max_per_channel
+        self.__messages: OrderedDict[int, tuple[float, Message]] = OrderedDict()
+        self.__timelines: dict[int, list[int]] = {}
+        self.__ttl = ttl
+
+    def __contains__(self, message_id: int):
+        return self.get(message_id) is not None
+
+    def __len__(self):
+        return len(self.__messages)
+
+    def _add(self, message: Message):
+        message_id = int(message["id"])
+        channel_id = int(message["channel_id"])
+
+        new = message_id not in self.__messages
+        self.__messages[message_id] = (monotonic(), message)
+        self.__messages.move_to_end(message_id)
+
+        if new:
+            timeline = self.__timelines.setdefault(channel_id, [])
+
+            # New messages are almost always the newest of their channel
+            if not timeline or timeline[-1] < message_id:
+                timeline.append(message_id)
+
+            else:
+                insort(timeline, message_id)
+
+            if self.__max_per_channel is not None and len(timeline) > self.__max_per_channel:
+                self._remove(timeline[0])
+
+        while len(self.__messages) > self.__max_messages:
+            self._remove(next(iter(self.__messages)))
+
+    def _expired(self, written_at: float):
+        return self.__ttl is not None and monotonic() - written_at > self.__ttl
+
+    def _remove(self, message_id: int):
+        entry = self.__messages.pop(message_id, None)
+
+        if entry is None:
+            return None
+
+        message = entry[1]
+        channel_id = int(message["channel_id"])
+        timeline = self.__timelines[channel_id]
+        del timeline[bisect_left(timeline, message_id)]
+
+        if not timeline:
+            del self.__timelines[channel_id]
+
+        return message
+
+    def channel_messages(self, channel_id: int, after: datetime | int | None = None,
+                         before: datetime | int | None = None):
+        """Cached messages of channel in snowflake order, optionally limited to messages created
+        after / before a snowflake or datetime (both exclusive)"""
+        timeline = self.__timelines.get(channel_id, [])
+
+        if isinstance(after, datetime):
+            after = from_datetime(after, high=True)
+
+        if isinstance(before, datetime):
+            before = from_datetime(before)
+
+        start = bisect_right(timeline, after) if after is not None else 0
+        end = bisect_left(timeline, before) if before is not None else len(timeline)
+
+        messages = []
+
+        for message_id in timeline[start:end]:
+            written_at, message = self.__messages[message_id]
+
+            if self._expired(written_at):
+                self._remove(message_id)
+
+            else:
+                messages.append(message)
+
+        return messages
+
+    def clear(self):
+        self.__messages.clear()
+        self.__timelines.clear()
+
+    def get(self, message_id: int):
+        entry = self.__messages.get(message_id)
+
+        if entry is None:
+            return None
+
+        if self._expired(entry[0]):
+            self._remove(message_id)
+            return None
+
+        self.__messages.move_to_end(message_id)
+        return entry[1]
+
+    def handle(self, event: ReceiveEvent | str, data: Any):
+        """Update cache from gateway dispatch event
+
+        Returns the previously cached message for MESSAGE_UPDATE and MESSAGE_DELETE (None if it
+        wasn't cached), and the list of previously cached messages for MESSAGE_DELETE_BULK.
+        """
+        if event == ReceiveEvent.MESSAGE_CREATE:
+            self._add(data)
+
+        elif event == ReceiveEvent.MESSAGE_UPDATE:
+            old = self.get(int(data["id"]))
+
+            # Updates may only contain the changed fields, only merge them into cached messages
+            if old is not None:
+                self._add(old | data)
+
+            return old
+
+        elif event == ReceiveEvent.MESSAGE_DELETE:
+            old = self.get(int(data["id"]))
+            self._remove(int(data["id"]))
+            return old
+
+        elif event == ReceiveEvent.MESSAGE_DELETE_BULK:
+            olds = []
+
+            for message_id in map(int, data["ids"]):
+                old = self.get(message_id)
+
+                if old is not None:
+                    olds.append(old)
+                    self._remove(message_id)
+
+            return olds
+
+        elif event in (ReceiveEvent.CHANNEL_DELETE, ReceiveEvent.THREAD_DELETE):
+            for message_id in list(self.__timelines.get(int(data["id"]), [])):
+                self._remove(message_id)
+
+    def purge(self):
+        """Evict all messages not created or updated within TTL"""
+        if self.__ttl is None:
+            return
+
+        for message_id, (written_at, _) in list(self.__messages.items()):
+            if self._expired(written_at):
+                self._remove(message_id)
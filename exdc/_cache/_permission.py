@@ -0,0 +1,212 @@
+from __future__ import annotations
+from functools import reduce
+from operator import or_
+from typing import Any
+
+from ._record import ChannelRecord, GuildMemberRecord, GuildRecord, THREAD_TYPES
+from ._state import State
+from ..type.channel import OverwriteType
+from ..type.gateway import ReceiveEvent
+from ..type.permissions import Permission
+
+ALL_PERMISSIONS = reduce(or_, Permission)
+
+
+class PermissionCache:
+    """Computes effective permissions of guild members from cached `State`
+
+    Results are memoized per (guild, channel, member) and invalidated by the role, channel and
+    member events passed to `handle`. `handle` should be called with every dispatch event right
+    after the `State` was updated with it.
+    """
+
+    def __init__(self, state: State):
+        self.__memo: dict[int, dict[int | None, dict[int, Permission]]] = {}
+        self.__state = state
+
+    @staticmethod
+    def _apply_overwrites(guild: GuildRecord, channel: ChannelRecord, user_id: int,
+                          roles: tuple[int, ...], base: int):
+        if base & Permission.ADMINISTRATOR:
+            return ALL_PERMISSIONS
+
+        permissions = base
+        allow = 0
+        deny = 0
+        member_overwrite = None
+
+        for overwrite in channel.permission_overwrites or ():
+            if overwrite.type == OverwriteType.ROLE:
+                if overwrite.id == guild.id:
+                    # @everyone overwrite is applied before role overwrites
+                    permissions &= ~overwrite.deny
+                    permissions |= overwrite.allow
+
+                elif overwrite.id in roles:
+                    allow |= overwrite.allow
+                    deny |= overwrite.deny
+
+            elif overwrite.id == user_id:
+                member_overwrite = overwrite
+
+        permissions &= ~deny
+        permissions |= allow
+
+        if member_overwrite is not None:
+            permissions &= ~member_overwrite.deny
+            permissions |= member_overwrite.allow
+
+        return Permission(permissions)
+
+    @staticmethod
+    def _base_permissions(guild: GuildRecord, user_id: int, roles: tuple[int, ...]):
+        if guild.owner_id == user_id:
+            return ALL_PERMISSIONS
+
+        everyone = guild.roles.get(guild.id)
+        permissions = everyone.permissions if everyone is not None else 0
+
+        for role_id in roles:
+            role = guild.roles.get(role_id)
+
+            if role is not None:
+                permissions |= role.permissions
+
+        if permissions & Permission.ADMINISTRATOR:
+            return ALL_PERMISSIONS
+
+        return Permission(permissions)
+
+    def _overwrite_channel(self, channel_id: int):
+        """Channel whose overwrites apply to `channel_id`, threads use their parent's"""
+        channel = self.__state.channel(channel_id)
+
+        if channel is None:
+            raise KeyError(f"Channel {channel_id} is not cached!")
+
+        if channel.type in THREAD_TYPES and channel.parent_id is not None:
+            parent = self.__state.channel(channel.parent_id)
+
+            if parent is not None:
+                return parent
+
+        return channel
+
+    def clear(self):
+        self.__memo.clear()
+
+    def compute(self, guild_id: int, user_id: int, channel_id: int | None = None):
+        """Effective permissions of member in guild, or in channel if `channel_id` is set"""
+        guild_memo = self.__memo.setdefault(guild_id, {})
+        channel_memo = guild_memo.setdefault(channel_id, {})
+
+        if user_id in channel_memo:
+            return channel_memo[user_id]
+
+        guild = self.__state.guild(guild_id)
+        member = self.__state.member(guild_id, user_id)
+
+        if guild is None or member is None:
+            raise KeyError(f"Member {user_id} of guild {guild_id} is not cached!")
+
+        permissions = self._compute(guild, member, user_id, channel_id)
+        channel_memo[user_id] = permissions
+        return permissions
+
+    def _compute(self, guild: GuildRecord, member: GuildMemberRecord, user_id: int,
+                 channel_id: int | None):
+        roles = tuple(member.roles)
+        permissions = self._base_permissions(guild, user_id, roles)
+
+        if channel_id is not None:
+            permissions = self._apply_overwrites(guild, self._overwrite_channel(channel_id),
+                                                 user_id, roles, permissions)
+
+        return permissions
+
+    def handle(self, event: ReceiveEvent | str, data: Any):
+        """Invalidate memoized permissions affected by gateway dispatch event"""
+        if event in (ReceiveEvent.GUILD_CREATE, ReceiveEvent.GUILD_UPDATE,
+                     ReceiveEvent.GUILD_DELETE):
+            self.__memo.pop(int(data["id"]), None)
+
+        elif event in (ReceiveEvent.GUILD_ROLE_CREATE, ReceiveEvent.GUILD_ROLE_UPDATE,
+                       ReceiveEvent.GUILD_ROLE_DELETE):
+            self.__memo.pop(int(data["guild_id"]), None)
+
+        elif event in (ReceiveEvent.CHANNEL_UPDATE, ReceiveEvent.CHANNEL_DELETE,
+                       ReceiveEvent.THREAD_UPDATE, ReceiveEvent.THREAD_DELETE):
+            guild_memo = self.__memo.get(int(data.get("guild_id", 0)))
+
+            if guild_memo is not None:
+                channel_id = int(data["id"])
+                guild_memo.pop(channel_id, None)
+
+                # Threads inherit overwrites of their parent channel
+                if event in (ReceiveEvent.CHANNEL_UPDATE, ReceiveEvent.CHANNEL_DELETE):
+                    for thread in self.__state.channels(int(data["guild_id"])):
+                        if thread.parent_id == channel_id and thread.type in THREAD_TYPES:
+                            guild_memo.pop(thread.id, None)
+
+        elif event in (ReceiveEvent.GUILD_MEMBER_UPDATE, ReceiveEvent.GUILD_MEMBER_REMOVE):
+            guild_memo = self.__memo.get(int(data["guild_id"]))
+
+            if guild_memo is not None:
+                user_id = int(data["user"]["id"])
+
+                for channel_memo in guild_memo.values():
+                    channel_memo.pop(user_id, None)
+
+    def members_with(self, guild_id: int, permission: Permission,
+                     channel_id: int | None = None):
+        """IDs of all cached guild members having `permission` (in channel if `channel_id` set)
+
+        Permissions are computed once per distinct set of roles instead of once per member, only
+        the guild owner and members with a member overwrite in the channel are computed
+        individually.
+        """
+        guild = self.__state.guild(guild_id)
+
+        if guild is None:
+            raise KeyError(f"Guild {guild_id} is not cached!")
+
+        if channel_id is not None:
+            channel = self._overwrite_channel(channel_id)
+            member_overwrites = {overwrite.id
+                                 for overwrite in channel.permission_overwrites or ()
+                                 if overwrite.type == OverwriteType.MEMBER}
+
+        else:
+            channel = None
+            member_overwrites = set()
+
+        by_roles: dict[bytes, bool] = {}
+        user_ids: list[int] = []
+
+        for member in self.__state.members(guild_id):
+            user_id = member.user_id
+
+            if user_id == guild.owner_id or user_id in member_overwrites:
+                if self.compute(guild_id, user_id, channel_id=channel_id) & permission == \
+                        permission:
+                    user_ids.append(user_id)
+
+                continue
+
+            key = member.roles.tobytes()
+            allowed = by_roles.get(key)
+
+            if allowed is None:
+                roles = tuple(member.roles)
+                permissions = self._base_permissions(guild, user_id, roles)
+
+                if channel is not None:
+                    permissions = self._apply_overwrites(guild, channel, user_id, roles,
+                                                         permissions)
+
+                allowed = by_roles[key] = permissions & permission == permission
+
+            if allowed:
+                user_ids.append(user_id)
+
+        return user_ids
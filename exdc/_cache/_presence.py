@@ -0,0 +1,175 @@
+from __future__ import annotations
+from typing import Any, Iterable
+
+from ..type.gateway import PresenceActivity, PresenceStatus, ReceiveEvent
+
+STATUSES = tuple(PresenceStatus)
+STATUS_CODES = {status.value: code for code, status in enumerate(STATUSES)}
+CLIENTS = ("desktop", "mobile", "web")
+
+
+class Presence:
+    """Compact presence of a user
+
+    Status is stored as an index into `PresenceStatus`, per-client statuses are packed into a
+    single int (4 bits per client) and activities are reduced to tuples of their relevant fields.
+    Equal presences of a user are shared between all guilds.
+    """
+
+    __slots__ = ("_status", "_client_status", "activities")
+
+    def __init__(self, status: int, client_status: int,
+                 activities: tuple[tuple[Any, ...], ...]):
+        self._status = status
+        self._client_status = client_status
+        self.activities = activities
+
+    def __eq__(self, other: object):
+        if not isinstance(other, Presence):
+            return NotImplemented
+
+        return self._status == other._status and \
+            self._client_status == other._client_status and self.activities == other.activities
+
+    def __hash__(self):
+        return hash((self._status, self._client_status, self.activities))
+
+    def __repr__(self):
+        return f"Presence({self.status.value!r}, {self.client_status!r}, {self.activities!r})"
+
+    @property
+    def client_status(self):
+        """Status per active client (desktop, mobile, web)"""
+        client_status: dict[str, PresenceStatus] = {}
+
+        for index, client in enumerate(CLIENTS):
+            code = (self._client_status >> (4 * index)) & 0xF
+
+            if code:
+                client_status[client] = STATUSES[code - 1]
+
+        return client_status
+
+    @property
+    def status(self):
+        return STATUSES[self._status]
+
+
+class PresenceCache:
+    """Presences keyed by (guild, user), built from gateway dispatch events
+
+    `handle` returns False for PRESENCE_UPDATE events which don't change any relevant field
+    (status, client status and the `activity_fields` of activities) of the cached presence, so
+    they can be dropped before reaching handlers. With `dedupe_guilds` set, updates already seen
+    from another guild the user shares with the bot are dropped as well.
+
+    Offline users are not stored.
+    """
+
+    def __init__(self, activity_fields: Iterable[str] = ("type", "name", "state", "details",
+                                                         "url"),
+                 dedupe_guilds: bool = False):
+        self.__activity_fields = tuple(activity_fields)
+        self.__dedupe_guilds = dedupe_guilds
+        self.__guilds: dict[int, dict[int, Presence]] = {}
+        self.__users: dict[int, Presence] = {}
+        self.__user_refs: dict[int, int] = {}
+
+    def _encode(self, presence: dict[str, Any]):
+        client_status = 0
+
+        for index, client in enumerate(CLIENTS):
+            status = presence.get("client_status", {}).get(client)
+
+            if status is not None:
+                client_status |= (STATUS_CODES[status] + 1) << (4 * index)
+
+        activities: list[PresenceActivity] = presence.get("activities") or []
+        return Presence(STATUS_CODES[presence["status"]], client_status,
+                        tuple(tuple(activity.get(field) for field in self.__activity_fields)
+                              for activity in activities))
+
+    def _remove(self, guild_id: int, user_id: int):
+        if self.__guilds.get(guild_id, {}).pop(user_id, None) is None:
+            return
+
+        self.__user_refs[user_id] -= 1
+
+        if self.__user_refs[user_id] == 0:
+            del self.__user_refs[user_id]
+            del self.__users[user_id]
+
+    def _update(self, guild_id: int, presence: dict[str, Any]):
+        """Store presence, returns whether it changed for the guild and whether it changed for
+        the user"""
+        user_id = int(presence["user"]["id"])
+        guild_presences = self.__guilds.setdefault(guild_id, {})
+        old = guild_presences.get(user_id)
+        new = self._encode(presence)
+        shared = self.__users.get(user_id)
+        user_changed = shared != new
+
+        if new.status == PresenceStatus.OFFLINE:
+            if user_changed and user_id in self.__user_refs:
+                self.__users[user_id] = new
+
+            self._remove(guild_id, user_id)
+            return old is not None, user_changed and old is not None
+
+        if old == new:
+            return False, False
+
+        # Share one presence object per user between all guilds
+        if user_changed:
+            self.__users[user_id] = new
+
+        else:
+            new = shared
+
+        if old is None:
+            self.__user_refs[user_id] = self.__user_refs.get(user_id, 0) + 1
+
+        guild_presences[user_id] = new
+        return True, user_changed
+
+    def get(self, guild_id: int, user_id: int):
+        """Presence of user in guild, None if offline or unknown"""
+        return self.__guilds.get(guild_id, {}).get(user_id)
+
+    def guild(self, guild_id: int):
+        """Presences of all online users of guild mapped by user ID"""
+        return dict(self.__guilds.get(guild_id, {}))
+
+    def handle(self, event: ReceiveEvent | str, data: Any):
+        """Update presences from gateway dispatch event, returns False if event is a no-op
+        PRESENCE_UPDATE that should be dropped, True otherwise"""
+        if event == ReceiveEvent.PRESENCE_UPDATE:
+            guild_changed, user_changed = self._update(int(data["guild_id"]), data)
+            return user_changed if self.__dedupe_guilds else guild_changed
+
+        if event == ReceiveEvent.GUILD_CREATE:
+            if not data.get("unavailable"):
+                guild_id = int(data["id"])
+
+                for user_id in list(self.__guilds.get(guild_id, {})):
+                    self._remove(guild_id, user_id)
+
+                for presence in data.get("presences", []):
+                    self._update(guild_id, presence)
+
+        elif event == ReceiveEvent.GUILD_DELETE:
+            guild_id = int(data["id"])
+
+            for user_id in list(self.__guilds.get(guild_id, {})):
+                self._remove(guild_id, user_id)
+
+            self.__guilds.pop(guild_id, None)
+
+        elif event == ReceiveEvent.GUILD_MEMBER_REMOVE:
+            self._remove(int(data["guild_id"]), int(data["user"]["id"]))
+
+        return True
+
+    def user(self, user_id: int):
+        """Last presence of user seen in any guild, None if unknown"""
+        return self.__users.get(user_id)
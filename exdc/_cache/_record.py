@@ -0,0 +1,468 @@
+from __future__ import annotations
+from array import array
+from typing import Any
+
+from ..snowflake import to_array
+from ..type.channel import Channel, ChannelType, Overwrite
+from ..type.guild import Guild, GuildMember
+from ..type.permissions import Role
+from ..type.user import AvatarDecorationData, User
+
+THREAD_TYPES = (ChannelType.ANNOUNCEMENT_THREAD, ChannelType.PUBLIC_THREAD,
+                ChannelType.PRIVATE_THREAD)
+
+
+class UserRecord:
+    """Compact representation of a cached user.
+
+    Snowflakes are stored as ints. Optional fields missing from the payload are stored as None
+    and are left out again by `to_dict`. Fields without a slot are kept in `extra`, unless they
+    are null, so common payloads don't need a dict per user.
+    """
+
+    __slots__ = ("id", "username", "discriminator", "global_name", "avatar", "bot", "system",
+                 "banner", "accent_color", "flags", "public_flags", "avatar_decoration_data",
+                 "extra")
+
+    # Optional fields with a slot, in slot order
+    OPTIONAL_FIELDS = ("global_name", "bot", "system", "banner", "accent_color", "flags",
+                       "public_flags", "avatar_decoration_data")
+
+    def __init__(self, id: int, username: str, discriminator: str, avatar: str | None,
+                 bot: bool | None = None, public_flags: int | None = None,
+                 extra: dict[str, Any] | None = None, global_name: str | None = None,
+                 system: bool | None = None, banner: str | None = None,
+                 accent_color: int | None = None, flags: int | None = None,
+                 avatar_decoration_data: AvatarDecorationData | None = None):
+        self.id = id
+        self.username = username
+        self.discriminator = discriminator
+        self.global_name = global_name
+        self.avatar = avatar
+        self.bot = bot
+        self.system = system
+        self.banner = banner
+        self.accent_color = accent_color
+        self.flags = flags
+        self.public_flags = public_flags
+        self.avatar_decoration_data = avatar_decoration_data
+        self.extra = extra
+
+    def __eq__(self, other: object):
+        if not isinstance(other, UserRecord):
+            return NotImplemented
+
+        return all(getattr(self, slot) == getattr(other, slot) for slot in UserRecord.__slots__)
+
+    __hash__ = None
+
+    def copy(self):
+        return UserRecord(self.id, self.username, self.discriminator, self.avatar,
+                          extra=self.extra,
+                          **{field: getattr(self, field) for field in UserRecord.OPTIONAL_FIELDS})
+
+    @classmethod
+    def from_dict(cls, user: User):
+        extra = {key: value for key, value in user.items()
+                 if value is not None and key not in ("id", "username", "discriminator", "avatar")
+                 and key not in UserRecord.OPTIONAL_FIELDS}
+
+        return cls(int(user["id"]), user["username"], user["discriminator"], user["avatar"],
+                   extra=extra or None,
+                   **{field: user.get(field) for field in UserRecord.OPTIONAL_FIELDS})
+
+    def to_dict(self):
+        user: User = {"id": str(self.id), "username": self.username,
+                      "discriminator": self.discriminator, "avatar": self.avatar}
+
+        for field in UserRecord.OPTIONAL_FIELDS:
+            value = getattr(self, field)
+
+            if value is not None:
+                user[field] = value
+
+        if self.extra:
+            user |= self.extra
+
+        return user
+
+
+class RecordDiff:
+    """Field-level difference between the cached record of an entity before and after an update
+
+    Guild, member, role and channel records are never modified once cached, updates replace them
+    (copy-on-write), so `old` is the untouched previous record rather than a copy of it. User
+    records are shared by all members of the user and updated in place, diffs of users hold
+    copies of them instead. Changed fields are only compared once `changed` is first accessed.
+    """
+
+    __slots__ = ("old", "new", "_changed", "_extra")
+
+    def __init__(self, old: Any, new: Any, extra: dict[str, tuple[Any, Any]] | None = None):
+        self.old = old
+        self.new = new
+        self._changed = None
+        self._extra = extra
+
+    def __bool__(self):
+        return bool(self.changed)
+
+    def __contains__(self, field: str):
+        return field in self.changed
+
+    def __repr__(self):
+        return f"RecordDiff({self.changed!r})"
+
+    @staticmethod
+    def _extra_changes(old: dict[str, Any] | None, new: dict[str, Any] | None):
+        old = old or {}
+        new = new or {}
+        return {key: (old.get(key), new.get(key)) for key in old.keys() | new.keys()
+                if old.get(key) != new.get(key)}
+
+    @property
+    def changed(self):
+        """Changed fields mapped to their (old, new) values, fields kept in `extra` of records
+        are compared one by one"""
+        if self._changed is None:
+            self._changed = {}
+
+            for slot in type(self.new).__slots__:
+                old, new = getattr(self.old, slot), getattr(self.new, slot)
+
+                if slot == "extra":
+                    self._changed |= RecordDiff._extra_changes(old, new)
+
+                elif old != new:
+                    self._changed[slot] = (old, new)
+
+            if self._extra:
+                self._changed |= self._extra
+
+        return self._changed
+
+
+class RoleRecord:
+    """Compact representation of a cached role with permissions stored as an int bitfield."""
+
+    __slots__ = ("id", "name", "color", "hoist", "icon", "unicode_emoji", "position",
+                 "permissions", "managed", "mentionable", "tags")
+
+    def __init__(self, id: int, name: str, color: int, hoist: bool, position: int,
+                 permissions: int, managed: bool, mentionable: bool, icon: str | None = None,
+                 unicode_emoji: str | None = None, tags: dict[str, Any] | None = None):
+        self.id = id
+        self.name = name
+        self.color = color
+        self.hoist = hoist
+        self.icon = icon
+        self.unicode_emoji = unicode_emoji
+        self.position = position
+        self.permissions = permissions
+        self.managed = managed
+        self.mentionable = mentionable
+        self.tags = tags
+
+    def __eq__(self, other: object):
+        if not isinstance(other, RoleRecord):
+            return NotImplemented
+
+        return all(getattr(self, slot) == getattr(other, slot) for slot in RoleRecord.__slots__)
+
+    __hash__ = None
+
+    @classmethod
+    def from_dict(cls, role: Role):
+        return cls(int(role["id"]), role["name"], role["color"], role["hoist"], role["position"],
+                   int(role["permissions"]), role["managed"], role["mentionable"],
+                   icon=role.get("icon"), unicode_emoji=role.get("unicode_emoji"),
+                   tags=role.get("tags"))
+
+    def to_dict(self):
+        role: Role = {"id": str(self.id), "name": self.name, "color": self.color,
+                      "hoist": self.hoist, "position": self.position,
+                      "permissions": str(self.permissions), "managed": self.managed,
+                      "mentionable": self.mentionable}
+
+        if self.icon is not None:
+            role |= {"icon": self.icon}
+
+        if self.unicode_emoji is not None:
+            role |= {"unicode_emoji": self.unicode_emoji}
+
+        if self.tags is not None:
+            role |= {"tags": self.tags}
+
+        return role
+
+
+class GuildMemberRecord:
+    """Compact representation of a cached guild member.
+
+    Role IDs are kept in an unsigned 64-bit array instead of a list of strings, and member
+    permissions (if present) are stored as an int bitfield.
+    """
+
+    __slots__ = ("user", "nick", "avatar", "roles", "joined_at", "premium_since", "deaf", "mute",
+                 "flags", "pending", "permissions", "communication_disabled_until")
+
+    def __init__(self, roles: array, joined_at: str, deaf: bool, mute: bool, flags: int,
+                 user: UserRecord | None = None, nick: str | None = None,
+                 avatar: str | None = None, premium_since: str | None = None,
+                 pending: bool | None = None, permissions: int | None = None,
+                 communication_disabled_until: str | None = None):
+        self.user = user
+        self.nick = nick
+        self.avatar = avatar
+        self.roles = roles
+        self.joined_at = joined_at
+        self.premium_since = premium_since
+        self.deaf = deaf
+        self.mute = mute
+        self.flags = flags
+        self.pending = pending
+        self.permissions = permissions
+        self.communication_disabled_until = communication_disabled_until
+
+    def __eq__(self, other: object):
+        if not isinstance(other, GuildMemberRecord):
+            return NotImplemented
+
+        return all(getattr(self, slot) == getattr(other, slot)
+                   for slot in GuildMemberRecord.__slots__)
+
+    __hash__ = None
+
+    def copy(self):
+        return GuildMemberRecord(self.roles, self.joined_at, self.deaf, self.mute, self.flags,
+                                 user=self.user, nick=self.nick, avatar=self.avatar,
+                                 premium_since=self.premium_since, pending=self.pending,
+                                 permissions=self.permissions,
+                                 communication_disabled_until=self.communication_disabled_until)
+
+    @classmethod
+    def from_dict(cls, member: GuildMember, user: UserRecord | None = None):
+        """Create record from member payload, optionally reusing an already cached user record
+        instead of creating a new one from the `user` field."""
+        if user is None and "user" in member:
+            user = UserRecord.from_dict(member["user"])
+
+        permissions = member.get("permissions")
+
+        return cls(to_array(member["roles"]), member["joined_at"],
+                   member.get("deaf", False), member.get("mute", False),
+                   member.get("flags", 0), user=user, nick=member.get("nick"),
+                   avatar=member.get("avatar"), premium_since=member.get("premium_since"),
+                   pending=member.get("pending"),
+                   permissions=int(permissions) if permissions is not None else None,
+                   communication_disabled_until=member.get("communication_disabled_until"))
+
+    @property
+    def user_id(self):
+        return self.user.id if self.user is not None else None
+
+    def to_dict(self):
+        member: GuildMember = {"roles": [str(role_id) for role_id in self.roles],
+                               "joined_at": self.joined_at, "deaf": self.deaf, "mute": self.mute,
+                               "flags": self.flags}
+
+        if self.user is not None:
+            member |= {"user": self.user.to_dict()}
+
+        if self.nick is not None:
+            member |= {"nick": self.nick}
+
+        if self.avatar is not None:
+            member |= {"avatar": self.avatar}
+
+        if self.premium_since is not None:
+            member |= {"premium_since": self.premium_since}
+
+        if self.pending is not None:
+            member |= {"pending": self.pending}
+
+        if self.permissions is not None:
+            member |= {"permissions": str(self.permissions)}
+
+        if self.communication_disabled_until is not None:
+            member |= {"communication_disabled_until": self.communication_disabled_until}
+
+        return member
+
+
+class OverwriteRecord:
+    """Compact representation of a channel permission overwrite."""
+
+    __slots__ = ("id", "type", "allow", "deny")
+
+    def __init__(self, id: int, type: int, allow: int, deny: int):
+        self.id = id
+        self.type = type
+        self.allow = allow
+        self.deny = deny
+
+    def __eq__(self, other: object):
+        if not isinstance(other, OverwriteRecord):
+            return NotImplemented
+
+        return self.id == other.id and self.type == other.type and \
+            self.allow == other.allow and self.deny == other.deny
+
+    __hash__ = None
+
+    @classmethod
+    def from_dict(cls, overwrite: Overwrite):
+        return cls(int(overwrite["id"]), overwrite["type"], int(overwrite["allow"]),
+                   int(overwrite["deny"]))
+
+    def to_dict(self):
+        overwrite: Overwrite = {"id": str(self.id), "type": self.type, "allow": str(self.allow),
+                                "deny": str(self.deny)}
+        return overwrite
+
+
+class ChannelRecord:
+    """Compact representation of a cached channel.
+
+    Fields needed for lookups and permission computation are slotted, all remaining fields of
+    the payload are kept as-is in `extra`.
+    """
+
+    __slots__ = ("id", "type", "guild_id", "parent_id", "position", "name",
+                 "permission_overwrites", "extra")
+
+    def __init__(self, id: int, type: int, guild_id: int | None = None,
+                 parent_id: int | None = None, position: int | None = None,
+                 name: str | None = None,
+                 permission_overwrites: tuple[OverwriteRecord, ...] | None = None,
+                 extra: dict[str, Any] | None = None):
+        self.id = id
+        self.type = type
+        self.guild_id = guild_id
+        self.parent_id = parent_id
+        self.position = position
+        self.name = name
+        self.permission_overwrites = permission_overwrites
+        self.extra = extra
+
+    def __eq__(self, other: object):
+        if not isinstance(other, ChannelRecord):
+            return NotImplemented
+
+        return all(getattr(self, slot) == getattr(other, slot)
+                   for slot in ChannelRecord.__slots__)
+
+    __hash__ = None
+
+    @classmethod
+    def from_dict(cls, channel: Channel, guild_id: int | None = None):
+        """Create record from channel payload, `guild_id` is used for channels received as part
+        of GUILD_CREATE which don't include their guild ID."""
+        extra = {key: value for key, value in channel.items()
+                 if key not in ("id", "type", "guild_id", "parent_id", "position", "name",
+                                "permission_overwrites")}
+
+        if "guild_id" in channel:
+            guild_id = int(channel["guild_id"])
+
+        parent_id = channel.get("parent_id")
+
+        if "permission_overwrites" in channel:
+            overwrites = tuple(OverwriteRecord.from_dict(overwrite)
+                               for overwrite in channel["permission_overwrites"])
+
+        else:
+            overwrites = None
+
+        return cls(int(channel["id"]), channel["type"], guild_id=guild_id,
+                   parent_id=int(parent_id) if parent_id is not None else None,
+                   position=channel.get("position"), name=channel.get("name"),
+                   permission_overwrites=overwrites, extra=extra or None)
+
+    def to_dict(self):
+        channel: Channel = {"id": str(self.id), "type": self.type}
+
+        if self.guild_id is not None:
+            channel |= {"guild_id": str(self.guild_id)}
+
+        if self.parent_id is not None:
+            channel |= {"parent_id": str(self.parent_id)}
+
+        if self.position is not None:
+            channel |= {"position": self.position}
+
+        if self.name is not None:
+            channel |= {"name": self.name}
+
+        if self.permission_overwrites is not None:
+            channel |= {"permission_overwrites": [overwrite.to_dict()
+                                                  for overwrite in self.permission_overwrites]}
+
+        if self.extra:
+            channel |= self.extra
+
+        return channel
+
+
+class GuildRecord:
+    """Compact representation of a cached guild.
+
+    Roles are stored as `RoleRecord`s keyed by their int ID. Channels, threads, members and other
+    collections sent with GUILD_CREATE are not part of the record and should be cached
+    separately. All remaining fields of the payload are kept as-is in `extra`.
+    """
+
+    __slots__ = ("id", "name", "icon", "owner_id", "roles", "features", "preferred_locale",
+                 "extra")
+
+    GATEWAY_FIELDS = ("channels", "guild_scheduled_events", "joined_at", "large", "member_count",
+                      "members", "presences", "stage_instances", "threads", "unavailable",
+                      "voice_states")
+
+    def __init__(self, id: int, name: str, icon: str | None, owner_id: int,
+                 roles: dict[int, RoleRecord], features: tuple[str, ...], preferred_locale: str,
+                 extra: dict[str, Any] | None = None):
+        self.id = id
+        self.name = name
+        self.icon = icon
+        self.owner_id = owner_id
+        self.roles = roles
+        self.features = features
+        self.preferred_locale = preferred_locale
+        self.extra = extra
+
+    def __eq__(self, other: object):
+        if not isinstance(other, GuildRecord):
+            return NotImplemented
+
+        return all(getattr(self, slot) == getattr(other, slot) for slot in GuildRecord.__slots__)
+
+    __hash__ = None
+
+    def copy(self):
+        """Copy with its own roles dict, role records are shared"""
+        return GuildRecord(self.id, self.name, self.icon, self.owner_id, dict(self.roles),
+                           self.features, self.preferred_locale, extra=self.extra)
+
+    @classmethod
+    def from_dict(cls, guild: Guild):
+        extra = {key: value for key, value in guild.items()
+                 if key not in ("id", "name", "icon", "owner_id", "roles", "features",
+                                "preferred_locale") + GuildRecord.GATEWAY_FIELDS}
+
+        roles = {role.id: role for role in map(RoleRecord.from_dict, guild["roles"])}
+
+        return cls(int(guild["id"]), guild["name"], guild["icon"], int(guild["owner_id"]), roles,
+                   tuple(guild["features"]), guild["preferred_locale"], extra=extra or None)
+
+    def to_dict(self):
+        guild: Guild = {"id": str(self.id), "name": self.name, "icon": self.icon,
+                        "owner_id": str(self.owner_id),
+                        "roles": [role.to_dict() for role in self.roles.values()],
+                        "features": list(self.features),
+                        "preferred_locale": self.preferred_locale}
+
+        if self.extra:
+            guild |= self.extra
+
+        return guild
@@ -0,0 +1,91 @@
+from __future__ import annotations
+from pathlib import Path
+from sqlite3 import connect
+
+
+class SpillStore:
+    """SQLite file holding encoded guilds evicted from memory by `State`"""
+
+    def __init__(self, path: Path | str):
+        self.__db = connect(path)
+        self.__db.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE IF NOT EXISTS guilds (id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS channels (id INTEGER PRIMARY KEY,
+                                                 guild_id INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS channels_guild_id ON channels (guild_id);
+            CREATE TABLE IF NOT EXISTS users (id INTEGER NOT NULL, guild_id INTEGER NOT NULL,
+                                              PRIMARY KEY (id, guild_id));
+            CREATE INDEX IF NOT EXISTS users_guild_id ON users (guild_id);
+        """)
+        self.__guild_ids: set[int] = set()
+        # Guilds spilled by a previous process are stale, state is rebuilt from the gateway
+        self.clear()
+
+    def __contains__(self, guild_id: int):
+        return guild_id in self.__guild_ids
+
+    def __len__(self):
+        return len(self.__guild_ids)
+
+    def channels(self):
+        """(channel ID, guild ID) pairs of all spilled channels"""
+        return self.__db.execute("SELECT id, guild_id FROM channels").fetchall()
+
+    def clear(self):
+        with self.__db:
+            self.__db.execute("DELETE FROM guilds")
+            self.__db.execute("DELETE FROM channels")
+            self.__db.execute("DELETE FROM users")
+
+        self.__guild_ids = set()
+
+    def close(self):
+        self.__db.close()
+
+    def get(self, guild_id: int):
+        row = self.__db.execute("SELECT data FROM guilds WHERE id = ?", (guild_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def guild_of(self, channel_id: int):
+        """ID of spilled guild owning channel, None if channel isn't spilled"""
+        row = self.__db.execute("SELECT guild_id FROM channels WHERE id = ?",
+                                (channel_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def guild_of_user(self, user_id: int):
+        """ID of a spilled guild user is a member of, None if user isn't spilled"""
+        row = self.__db.execute("SELECT guild_id FROM users WHERE id = ? LIMIT 1",
+                                (user_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    @property
+    def guild_ids(self):
+        return set(self.__guild_ids)
+
+    def pop(self, guild_id: int):
+        """Remove spilled guild, returns its encoded data (None if it wasn't spilled)"""
+        if guild_id not in self.__guild_ids:
+            return None
+
+        data = self.get(guild_id)
+
+        with self.__db:
+            self.__db.execute("DELETE FROM guilds WHERE id = ?", (guild_id,))
+            self.__db.execute("DELETE FROM channels WHERE guild_id = ?", (guild_id,))
+            self.__db.execute("DELETE FROM users WHERE guild_id = ?", (guild_id,))
+
+        self.__guild_ids.discard(guild_id)
+        return data
+
+    def put(self, guild_id: int, data: bytes, channel_ids: list[int], user_ids: list[int]):
+        with self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO guilds (id, data) VALUES (?, ?)",
+                              (guild_id, data))
+            self.__db.executemany("INSERT OR REPLACE INTO channels (id, guild_id) VALUES (?, ?)",
+                                  ((channel_id, guild_id) for channel_id in channel_ids))
+            self.__db.executemany("INSERT OR REPLACE INTO users (id, guild_id) VALUES (?, ?)",
+                                  ((user_id, guild_id) for user_id in user_ids))
+
+        self.__guild_ids.add(guild_id)
@@ -0,0 +1,525 @@
+from __future__ import annotations
+from array import array
+from collections import OrderedDict
+from json import dumps, loads
+from logging import getLogger
+from mmap import ACCESS_READ, mmap
+from os import replace
+from pathlib import Path
+from struct import Struct
+from time import monotonic
+from typing import Any
+from zlib import compress, decompress
+
+from ._record import ChannelRecord, GuildMemberRecord, GuildRecord, RecordDiff, RoleRecord, \
+    UserRecord
+from ._spill import SpillStore
+from ..type.channel import Channel
+from ..type.gateway import GatewaySession, ReceiveEvent
+from ..type.guild import Guild, GuildMember
+from ..type.user import User
+
+SNAPSHOT_MAGIC = b"EXDCSNAP"
+SNAPSHOT_VERSION = 1
+# magic, version, session length, guild count, channel count
+SNAPSHOT_HEADER = Struct("<8sHIII")
+# guild ID, blob offset, blob length
+SNAPSHOT_GUILD = Struct("<QQI")
+# channel ID, guild ID
+SNAPSHOT_CHANNEL = Struct("<QQ")
+
+
+class State:
+    """Cache of guilds, channels, members and users built from gateway dispatch events
+
+    Entities are stored as compact records. User records are shared between all guilds the user
+    is a member of. Pass `cache_members=False` to skip caching members (e.g. when using
+    `MemberStore` for them instead).
+
+    State can be dumped to a snapshot file together with the gateway session and loaded again
+    after a restart. Guilds of a loaded snapshot are only decoded once they are accessed or
+    receive an event, so the gateway session can be resumed right away.
+
+    With `spill_path` set, guilds are evicted to a SQLite file at that path once more than
+    `max_guilds` guilds are in memory (least recently active first) or when they are idle for
+    longer than passed to `evict_idle`. Spilled guilds are reloaded transparently once they are
+    accessed or receive an event.
+    """
+
+    # Events applied to a guild's cached state, others don't load (or mark active) their guild
+    GUILD_EVENTS = (ReceiveEvent.GUILD_CREATE, ReceiveEvent.GUILD_UPDATE,
+                    ReceiveEvent.GUILD_DELETE, ReceiveEvent.GUILD_ROLE_CREATE,
+                    ReceiveEvent.GUILD_ROLE_UPDATE, ReceiveEvent.GUILD_ROLE_DELETE,
+                    ReceiveEvent.CHANNEL_CREATE,
+                    ReceiveEvent.CHANNEL_UPDATE, ReceiveEvent.CHANNEL_DELETE,
+                    ReceiveEvent.THREAD_CREATE, ReceiveEvent.THREAD_UPDATE,
+                    ReceiveEvent.THREAD_DELETE, ReceiveEvent.THREAD_LIST_SYNC,
+                    ReceiveEvent.GUILD_MEMBER_ADD, ReceiveEvent.GUILD_MEMBER_UPDATE,
+                    ReceiveEvent.GUILD_MEMBER_REMOVE, ReceiveEvent.GUILD_MEMBERS_CHUNK)
+    __LOGGER = getLogger("exdc.State")
+
+    def __init__(self, cache_members: bool = True, spill_path: Path | str | None = None,
+                 max_guilds: int | None = None):
+        self.__activity: OrderedDict[int, float] = OrderedDict()
+        self.__cache_members = cache_members
+        self.__channels: dict[int, ChannelRecord] = {}
+        self.__guild_channels: dict[int, set[int]] = {}
+        self.__guilds: dict[int, GuildRecord] = {}
+        self.__max_guilds = max_guilds
+        self.__members: dict[int, dict[int, GuildMemberRecord]] = {}
+        self.__snapshot: mmap | None = None
+        self.__snapshot_channels: dict[int, int] = {}
+        self.__snapshot_guilds: dict[int, tuple[int, int]] = {}
+        self.__spill = SpillStore(spill_path) if spill_path is not None else None
+        self.__user_refs: dict[int, int] = {}
+        self.__users: dict[int, UserRecord] = {}
+
+    def _add_channel(self, channel: Channel, guild_id: int | None = None):
+        record = ChannelRecord.from_dict(channel, guild_id=guild_id)
+        self.__channels[record.id] = record
+
+        if record.guild_id is not None:
+            self.__guild_channels.setdefault(record.guild_id, set()).add(record.id)
+
+        return record
+
+    def _add_guild(self, guild: Guild, channels: list[Channel], members: list[GuildMember]):
+        guild_id = int(guild["id"])
+        self._remove_guild(guild_id)
+        self.__guilds[guild_id] = GuildRecord.from_dict(guild)
+
+        for channel in channels:
+            self._add_channel(channel, guild_id=guild_id)
+
+        for member in members:
+            self._add_member(guild_id, member)
+
+        self._touch(guild_id)
+
+    def _add_member(self, guild_id: int, member: GuildMember):
+        if not self.__cache_members:
+            return None
+
+        old = self.__members.get(guild_id, {}).get(int(member["user"]["id"]))
+        user, old_user = self._add_user(member["user"])
+        record = GuildMemberRecord.from_dict(member, user=user)
+
+        if old is not None:
+            # Member updates don't contain every field of the member object, carry over the
+            # fields missing from the payload from the cached record
+            for field in ("deaf", "mute", "flags", "pending", "permissions"):
+                if field not in member:
+                    setattr(record, field, getattr(old, field))
+
+        else:
+            self.__user_refs[user.id] = self.__user_refs.get(user.id, 0) + 1
+
+        self.__members.setdefault(guild_id, {})[user.id] = record
+
+        if old is None:
+            return None
+
+        # Member records share their user record, report its changes as a change of `user`
+        return RecordDiff(old, record,
+                          extra={"user": (old_user, user.copy())} if old_user is not None
+                          else None)
+
+    def _add_user(self, user: User):
+        """Add or update cached user, returns cached record and a copy of its previous state if
+        it changed"""
+        record = UserRecord.from_dict(user)
+        cached = self.__users.get(record.id)
+
+        if cached is None:
+            self.__users[record.id] = record
+            return record, None
+
+        if cached == record:
+            return cached, None
+
+        # Update cached record in place, so every member record sharing it stays up to date
+        old = cached.copy()
+
+        for slot in UserRecord.__slots__:
+            setattr(cached, slot, getattr(record, slot))
+
+        return cached, old
+
+    def _decode_guild(self, blob: bytes):
+        data = loads(decompress(blob))
+        self._add_guild(data["guild"], data["channels"], data["members"])
+
+    def _encode_guild(self, guild_id: int):
+        if guild_id in self.__snapshot_guilds:
+            # Guild was never decoded since the snapshot was loaded, copy its blob as-is
+            offset, length = self.__snapshot_guilds[guild_id]
+            return self.__snapshot[offset:offset + length]
+
+        if self.__spill is not None and guild_id in self.__spill:
+            return self.__spill.get(guild_id)
+
+        channels = [self.__channels[channel_id].to_dict()
+                    for channel_id in self.__guild_channels.get(guild_id, set())]
+        members = [member.to_dict() for member in self.__members.get(guild_id, {}).values()]
+        data = {"guild": self.__guilds[guild_id].to_dict(), "channels": channels,
+                "members": members}
+        return compress(dumps(data, separators=(",", ":")).encode("utf8"))
+
+    @staticmethod
+    def _event_guild_id(event: ReceiveEvent | str, data: Any):
+        """ID of guild event applies to, None if it doesn't apply to one"""
+        if event not in State.GUILD_EVENTS:
+            return None
+
+        if event in (ReceiveEvent.GUILD_CREATE, ReceiveEvent.GUILD_UPDATE,
+                     ReceiveEvent.GUILD_DELETE):
+            return int(data["id"])
+
+        if isinstance(data, dict) and data.get("guild_id") is not None:
+            return int(data["guild_id"])
+
+        return None
+
+    def _forget_guild(self, guild_id: int):
+        """Drop guild from loaded snapshot and spill store without decoding it"""
+        if self.__snapshot_guilds.pop(guild_id, None) is not None and \
+                not self.__snapshot_guilds:
+            self._release_snapshot()
+
+        if self.__spill is not None:
+            self.__spill.pop(guild_id)
+
+    def _load_guild(self, guild_id: int | None):
+        """Decode guild from loaded snapshot or spill store if it isn't in memory, and mark it as
+        active"""
+        if guild_id in self.__snapshot_guilds:
+            offset, length = self.__snapshot_guilds.pop(guild_id)
+            self._decode_guild(self.__snapshot[offset:offset + length])
+
+            if not self.__snapshot_guilds:
+                self._release_snapshot()
+
+        elif self.__spill is not None and guild_id in self.__spill:
+            State.__LOGGER.debug(f"Reloading guild {guild_id} from spill store!")
+            self._decode_guild(self.__spill.pop(guild_id))
+
+        elif guild_id in self.__activity:
+            self._touch(guild_id)
+
+    def _load_guilds(self):
+        for guild_id in list(self.__snapshot_guilds):
+            self._load_guild(guild_id)
+
+    def _release_snapshot(self):
+        if self.__snapshot is not None:
+            self.__snapshot.close()
+
+        self.__snapshot = None
+        self.__snapshot_channels.clear()
+        self.__snapshot_guilds.clear()
+
+    def _remove_channel(self, channel_id: int):
+        record = self.__channels.pop(channel_id, None)
+
+        if record is not None and record.guild_id is not None:
+            self.__guild_channels.get(record.guild_id, set()).discard(channel_id)
+
+        return record
+
+    def _remove_guild(self, guild_id: int):
+        for channel_id in self.__guild_channels.pop(guild_id, set()):
+            self.__channels.pop(channel_id, None)
+
+        for user_id in list(self.__members.get(guild_id, {})):
+            self._remove_member(guild_id, user_id)
+
+        self.__members.pop(guild_id, None)
+        self.__activity.pop(guild_id, None)
+        return self.__guilds.pop(guild_id, None)
+
+    def _remove_member(self, guild_id: int, user_id: int):
+        record = self.__members.get(guild_id, {}).pop(user_id, None)
+
+        if record is not None:
+            # Drop user once it is no longer a member of any cached guild
+            self.__user_refs[user_id] -= 1
+
+            if self.__user_refs[user_id] == 0:
+                del self.__user_refs[user_id]
+                self.__users.pop(user_id, None)
+
+        return record
+
+    def _spill_guild(self, guild_id: int):
+        channel_ids = list(self.__guild_channels.get(guild_id, set()))
+        user_ids = list(self.__members.get(guild_id, {}))
+        self.__spill.put(guild_id, self._encode_guild(guild_id), channel_ids, user_ids)
+        self._remove_guild(guild_id)
+
+    def _touch(self, guild_id: int):
+        self.__activity[guild_id] = monotonic()
+        self.__activity.move_to_end(guild_id)
+
+        if self.__spill is not None and self.__max_guilds is not None:
+            while len(self.__activity) > self.__max_guilds:
+                self._spill_guild(next(iter(self.__activity)))
+
+    def channel(self, channel_id: int):
+        if channel_id not in self.__channels:
+            if channel_id in self.__snapshot_channels:
+                self._load_guild(self.__snapshot_channels[channel_id])
+
+            elif self.__spill is not None:
+                self._load_guild(self.__spill.guild_of(channel_id))
+
+        return self.__channels.get(channel_id)
+
+    def channels(self, guild_id: int):
+        """Cached channels and threads of guild"""
+        self._load_guild(guild_id)
+        return [self.__channels[channel_id]
+                for channel_id in self.__guild_channels.get(guild_id, set())]
+
+    def dump(self, path: Path | str, session: GatewaySession | None = None):
+        """Write snapshot of cached state and gateway session (see `Gateway.session`) to file"""
+        guild_ids = list(self.__guilds) + list(self.__snapshot_guilds)
+
+        if self.__spill is not None:
+            guild_ids.extend(self.__spill.guild_ids)
+
+        blobs = [self._encode_guild(guild_id) for guild_id in guild_ids]
+        channels = [(channel.id, channel.guild_id) for channel in self.__channels.values()
+                    if channel.guild_id is not None]
+        channels.extend((channel_id, guild_id)
+                        for channel_id, guild_id in self.__snapshot_channels.items()
+                        if guild_id in self.__snapshot_guilds)
+
+        if self.__spill is not None:
+            channels.extend(self.__spill.channels())
+
+        session_data = dumps(session, separators=(",", ":")).encode("utf8")
+
+        offset = SNAPSHOT_HEADER.size + len(session_data) + \
+            SNAPSHOT_GUILD.size * len(guild_ids) + SNAPSHOT_CHANNEL.size * len(channels)
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+
+        with tmp_path.open("wb") as snapshot:
+            snapshot.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                                len(session_data), len(guild_ids),
+                                                len(channels)))
+            snapshot.write(session_data)
+
+            for guild_id, blob in zip(guild_ids, blobs):
+                snapshot.write(SNAPSHOT_GUILD.pack(guild_id, offset, len(blob)))
+                offset += len(blob)
+
+            for channel_id, guild_id in channels:
+                snapshot.write(SNAPSHOT_CHANNEL.pack(channel_id, guild_id))
+
+            for blob in blobs:
+                snapshot.write(blob)
+
+        # Replace snapshot atomically, so a crash while dumping never leaves a corrupt snapshot
+        replace(tmp_path, path)
+        State.__LOGGER.info(f"Dumped snapshot of {len(guild_ids)} guilds to {path}!")
+
+    def evict_idle(self, idle: float):
+        """Evict guilds without activity for `idle` seconds to the spill store"""
+        assert self.__spill is not None, "State was created without spill_path!"
+        deadline = monotonic() - idle
+
+        while self.__activity:
+            guild_id, active_at = next(iter(self.__activity.items()))
+
+            if active_at > deadline:
+                break
+
+            self._spill_guild(guild_id)
+
+    def guild(self, guild_id: int):
+        self._load_guild(guild_id)
+        return self.__guilds.get(guild_id)
+
+    @property
+    def guild_ids(self):
+        """IDs of all cached guilds, including ones not decoded from snapshot or spilled"""
+        guild_ids = set(self.__guilds) | set(self.__snapshot_guilds)
+
+        if self.__spill is not None:
+            guild_ids |= self.__spill.guild_ids
+
+        return guild_ids
+
+    @property
+    def guilds(self):
+        """Cached guilds held in memory (spilled guilds are not reloaded)"""
+        self._load_guilds()
+        return list(self.__guilds.values())
+
+    def handle(self, event: ReceiveEvent | str, data: Any):
+        """Update cached state from gateway dispatch event
+
+        For GUILD_UPDATE, GUILD_ROLE_UPDATE, CHANNEL_UPDATE, THREAD_UPDATE, GUILD_MEMBER_UPDATE
+        and USER_UPDATE of cached entities, returns a `RecordDiff` of the entity's records.
+        """
+        guild_id = self._event_guild_id(event, data)
+
+        # GUILD_CREATE replaces the guild entirely, no need to decode the stored one
+        if event == ReceiveEvent.GUILD_CREATE and not data.get("unavailable"):
+            self._forget_guild(guild_id)
+
+        self._load_guild(guild_id)
+
+        if event == ReceiveEvent.READY:
+            # New session, everything cached (or loaded from snapshot) is stale
+            self._release_snapshot()
+
+            if self.__spill is not None:
+                self.__spill.clear()
+
+            self.__activity.clear()
+            self.__channels.clear()
+            self.__guild_channels.clear()
+            self.__guilds.clear()
+            self.__members.clear()
+            self.__user_refs.clear()
+            self.__users.clear()
+
+        elif event == ReceiveEvent.GUILD_CREATE:
+            if not data.get("unavailable"):
+                self._add_guild(data, data.get("channels", []) + data.get("threads", []),
+                                data.get("members", []))
+
+        elif event == ReceiveEvent.GUILD_UPDATE:
+            old = self.__guilds.get(guild_id)
+            new = self.__guilds[guild_id] = GuildRecord.from_dict(data)
+            return RecordDiff(old, new) if old is not None else None
+
+        elif event == ReceiveEvent.GUILD_DELETE:
+            self._remove_guild(int(data["id"]))
+
+        elif event in (ReceiveEvent.GUILD_ROLE_CREATE, ReceiveEvent.GUILD_ROLE_UPDATE):
+            guild_id = int(data["guild_id"])
+            guild = self.__guilds.get(guild_id)
+
+            if guild is not None:
+                role = RoleRecord.from_dict(data["role"])
+                old = guild.roles.get(role.id)
+                # Replace guild record instead of modifying it, diffs may still hold the old one
+                guild = self.__guilds[guild_id] = guild.copy()
+                guild.roles[role.id] = role
+
+                if event == ReceiveEvent.GUILD_ROLE_UPDATE and old is not None:
+                    return RecordDiff(old, role)
+
+        elif event == ReceiveEvent.GUILD_ROLE_DELETE:
+            guild_id = int(data["guild_id"])
+            role_id = int(data["role_id"])
+            guild = self.__guilds.get(guild_id)
+
+            if guild is not None and role_id in guild.roles:
+                guild = self.__guilds[guild_id] = guild.copy()
+                del guild.roles[role_id]
+
+            members = self.__members.get(guild_id, {})
+
+            for user_id, member in members.items():
+                if role_id in member.roles:
+                    member = members[user_id] = member.copy()
+                    member.roles = array("Q", (role for role in member.roles if role != role_id))
+
+        elif event in (ReceiveEvent.CHANNEL_CREATE, ReceiveEvent.CHANNEL_UPDATE,
+                       ReceiveEvent.THREAD_CREATE, ReceiveEvent.THREAD_UPDATE):
+            old = self.__channels.get(int(data["id"]))
+            new = self._add_channel(data)
+
+            if event in (ReceiveEvent.CHANNEL_UPDATE, ReceiveEvent.THREAD_UPDATE) and \
+                    old is not None:
+                return RecordDiff(old, new)
+
+        elif event in (ReceiveEvent.CHANNEL_DELETE, ReceiveEvent.THREAD_DELETE):
+            self._remove_channel(int(data["id"]))
+
+        elif event == ReceiveEvent.THREAD_LIST_SYNC:
+            for thread in data["threads"]:
+                self._add_channel(thread)
+
+        elif event == ReceiveEvent.GUILD_MEMBER_ADD:
+            self._add_member(int(data["guild_id"]), data)
+
+        elif event == ReceiveEvent.GUILD_MEMBER_UPDATE:
+            return self._add_member(int(data["guild_id"]), data)
+
+        elif event == ReceiveEvent.GUILD_MEMBER_REMOVE:
+            self._remove_member(int(data["guild_id"]), int(data["user"]["id"]))
+
+        elif event == ReceiveEvent.GUILD_MEMBERS_CHUNK:
+            guild_id = int(data["guild_id"])
+
+            for member in data["members"]:
+                self._add_member(guild_id, member)
+
+        elif event == ReceiveEvent.USER_UPDATE:
+            new, old = self._add_user(data)
+            # The cached user record is updated in place by later updates, diff a copy of it
+            return RecordDiff(old, new.copy()) if old is not None else None
+
+    @classmethod
+    def load(cls, path: Path | str, cache_members: bool = True,
+             spill_path: Path | str | None = None, max_guilds: int | None = None):
+        """Load state snapshot written by `dump`, returns the state and the gateway session
+        stored with it
+
+        The snapshot file is memory-mapped, guilds are decoded lazily on first access.
+        """
+        with Path(path).open("rb") as snapshot:
+            data = mmap(snapshot.fileno(), 0, access=ACCESS_READ)
+
+        magic, version, session_length, guild_count, channel_count = \
+            SNAPSHOT_HEADER.unpack_from(data)
+
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            data.close()
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} state snapshot!")
+
+        offset = SNAPSHOT_HEADER.size
+        session: GatewaySession | None = loads(data[offset:offset + session_length])
+        offset += session_length
+
+        state = cls(cache_members=cache_members, spill_path=spill_path, max_guilds=max_guilds)
+        state.__snapshot = data
+
+        for guild_id, blob_offset, blob_length in SNAPSHOT_GUILD.iter_unpack(
+                data[offset:offset + SNAPSHOT_GUILD.size * guild_count]):
+            state.__snapshot_guilds[guild_id] = (blob_offset, blob_length)
+
+        offset += SNAPSHOT_GUILD.size * guild_count
+
+        for channel_id, guild_id in SNAPSHOT_CHANNEL.iter_unpack(
+                data[offset:offset + SNAPSHOT_CHANNEL.size * channel_count]):
+            state.__snapshot_channels[channel_id] = guild_id
+
+        if not state.__snapshot_guilds:
+            state._release_snapshot()
+
+        return state, session
+
+    def member(self, guild_id: int, user_id: int):
+        self._load_guild(guild_id)
+        return self.__members.get(guild_id, {}).get(user_id)
+
+    def members(self, guild_id: int):
+        """Cached members of guild"""
+        self._load_guild(guild_id)
+        return list(self.__members.get(guild_id, {}).values())
+
+    def user(self, user_id: int):
+        # Users aren't indexed in snapshots, decode all remaining guilds to find them
+        if user_id not in self.__users:
+            self._load_guilds()
+
+        if user_id not in self.__users and self.__spill is not None:
+            self._load_guild(self.__spill.guild_of_user(user_id))
+
+        return self.__users.get(user_id)
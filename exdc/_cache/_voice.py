@@ -0,0 +1,143 @@
+from __future__ import annotations
+from time import monotonic
+from typing import Any, Callable
+
+from ._index import StateIndex
+from ..type.gateway import ReceiveEvent
+from ..type.voice import VoiceState
+
+
+class VoiceStates:
+    """Voice states and voice session durations of guild members, maintained from gateway dispatch
+    events
+
+    The time each user joined their current channel is kept so session lengths are accounted for
+    when they leave (or move to another channel) without scanning any state. `handle` returns the
+    `(channel ID, seconds)` session ended by an event, None otherwise. Sessions continue through
+    guild outages, users which left meanwhile are accounted for once the guild is available again.
+
+    Channel occupancy is looked up in `index`, pass the `StateIndex` already maintained from the
+    same events to share it. Without one, an own index of voice states is kept.
+    """
+
+    def __init__(self, index: StateIndex | None = None, clock: Callable[[], float] = monotonic):
+        self.__clock = clock
+        self.__index = index if index is not None else StateIndex()
+        self.__own_index = index is None
+        self.__sessions: dict[int, dict[int, tuple[int, float]]] = {}
+        self.__states: dict[int, dict[int, VoiceState]] = {}
+        self.__totals: dict[int, dict[int, float]] = {}
+
+    def _end_session(self, guild_id: int, user_id: int, now: float):
+        session = self.__sessions.get(guild_id, {}).pop(user_id, None)
+
+        if session is None:
+            return None
+
+        channel_id, joined_at = session
+        duration = now - joined_at
+        totals = self.__totals.setdefault(guild_id, {})
+        totals[user_id] = totals.get(user_id, 0.0) + duration
+        return channel_id, duration
+
+    def _remove_guild(self, guild_id: int):
+        now = self.__clock()
+
+        for user_id in list(self.__sessions.get(guild_id, {})):
+            self._end_session(guild_id, user_id, now)
+
+        self.__sessions.pop(guild_id, None)
+        self.__states.pop(guild_id, None)
+
+    def _update(self, guild_id: int, voice_state: VoiceState, now: float):
+        user_id = int(voice_state["user_id"])
+        channel_id = voice_state["channel_id"]
+        channel_id = int(channel_id) if channel_id is not None else None
+        session = self.__sessions.get(guild_id, {}).get(user_id)
+
+        if channel_id is None:
+            self.__states.get(guild_id, {}).pop(user_id, None)
+            return self._end_session(guild_id, user_id, now)
+
+        self.__states.setdefault(guild_id, {})[user_id] = voice_state
+
+        # Mute/deaf/stream changes keep the current session running
+        if session is not None and session[0] == channel_id:
+            return None
+
+        ended = self._end_session(guild_id, user_id, now)
+        self.__sessions.setdefault(guild_id, {})[user_id] = (channel_id, now)
+        return ended
+
+    def channel_of(self, guild_id: int, user_id: int):
+        """ID of voice channel user is connected to in guild, None if not connected"""
+        return self.__index.voice_channel_of(guild_id, user_id)
+
+    def clear_totals(self):
+        """Reset accumulated durations, e.g. after they were persisted"""
+        self.__totals.clear()
+
+    def handle(self, event: ReceiveEvent | str, data: Any):
+        """Update voice states from gateway dispatch event, returns ended `(channel ID, seconds)`
+        session if any"""
+        if self.__own_index:
+            if event == ReceiveEvent.GUILD_CREATE:
+                # Only voice states are needed, they're cleared by guild without knowing channels
+                self.__index.handle(event, {key: data[key] for key in
+                                            ("id", "unavailable", "voice_states") if key in data})
+
+            elif event in (ReceiveEvent.GUILD_DELETE, ReceiveEvent.READY,
+                           ReceiveEvent.VOICE_STATE_UPDATE):
+                self.__index.handle(event, data)
+
+        if event == ReceiveEvent.VOICE_STATE_UPDATE:
+            if "guild_id" in data:
+                return self._update(int(data["guild_id"]), data, self.__clock())
+
+        elif event == ReceiveEvent.GUILD_CREATE:
+            if not data.get("unavailable"):
+                guild_id = int(data["id"])
+                now = self.__clock()
+                voice_states: list[VoiceState] = data.get("voice_states", [])
+                user_ids = {int(voice_state["user_id"]) for voice_state in voice_states}
+
+                # Users which left while the guild was unavailable
+                for user_id in set(self.__sessions.get(guild_id, {})).difference(user_ids):
+                    self.__states.get(guild_id, {}).pop(user_id, None)
+                    self._end_session(guild_id, user_id, now)
+
+                for voice_state in voice_states:
+                    self._update(guild_id, voice_state, now)
+
+        elif event == ReceiveEvent.GUILD_DELETE:
+            # Members stay connected through outages, only end sessions if the bot left the guild
+            if not data.get("unavailable"):
+                self._remove_guild(int(data["id"]))
+
+        elif event == ReceiveEvent.READY:
+            for guild_id in list(self.__sessions):
+                self._remove_guild(guild_id)
+
+        return None
+
+    def members(self, channel_id: int):
+        """IDs of users connected to voice channel"""
+        return self.__index.voice_members(channel_id)
+
+    def session_duration(self, guild_id: int, user_id: int):
+        """Seconds user has been connected to their current voice channel, 0 if not connected"""
+        session = self.__sessions.get(guild_id, {}).get(user_id)
+        return self.__clock() - session[1] if session is not None else 0.0
+
+    def state(self, guild_id: int, user_id: int):
+        """Last voice state of connected user, None if not connected"""
+        return self.__states.get(guild_id, {}).get(user_id)
+
+    def total_duration(self, guild_id: int, user_id: int):
+        """Seconds user spent in voice channels of guild, including the current session"""
+        return self.__totals.get(guild_id, {}).get(user_id, 0.0) + \
+            self.session_duration(guild_id, user_id)
+
+    def totals(self, guild_id: int):
+        """Accumulated seconds of finished sessions of guild mapped by user ID"""
+        return dict(self.__totals.get(guild_id, {}))
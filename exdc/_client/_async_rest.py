@@ -0,0 +1,632 @@
+from asyncio import AbstractEventLoop, as_completed, create_task, FIRST_COMPLETED, \
+    get_running_loop, Semaphore, sleep, Task, wait
+from datetime import datetime
+from functools import partial
+from logging import getLogger
+from time import time
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable
+from urllib.parse import quote
+
+from httpx import AsyncClient, Limits, Timeout, TransportError
+
+from ._flight import AsyncSingleFlight
+from ._ratelimit import Priority, RateLimiter
+from ._response_cache import ResponseCache
+from ._retry import RetryPolicy
+from ._rest import h2_available, REST
+from ._upload import Multipart, Upload, UploadLike
+from .._consts import __user_agent__
+from ..exception import RESTException
+from ..snowflake import from_timestamp
+from ..type.channel import AllowedMentions, Attachment, Channel, Embed, Message, MessageFlag, \
+    MessageReference
+from ..type.guild import Ban, GuildMember
+from ..type.interactions import Interaction, InteractionResponse
+from ..type.interactions.application_command import ApplicationCommand
+from ..type.interactions.message_component import ActionRowComponent
+from ..type.rest import GetGatewayResponse
+from ..type.user import User
+
+
+class AsyncREST:
+    """Asynchronous counterpart of `REST`, every request method is a coroutine
+
+    Rate limits are shared with `REST` clients using the same authorization, so both can be used
+    side by side with one token.
+    """
+
+    API_URL = REST.API_URL
+    VERSION = REST.VERSION
+    # Shared pools are bound to the event loop they were created on, one per loop
+    __CLIENTS: dict[AbstractEventLoop, AsyncClient] = {}
+    __FLIGHTS = AsyncSingleFlight()
+    __LOGGER = getLogger("exdc.AsyncREST")
+    __POOL_OPTIONS: dict = {}
+
+    def __init__(self, authorization: str | None = None, user_agent: str | None = None,
+                 rate_limiter: RateLimiter | None = None, max_retries: int = 3,
+                 client: AsyncClient | None = None, response_cache: ResponseCache | None = None,
+                 coalesce: bool = True, priority: Priority = Priority.USER,
+                 retry_policy: RetryPolicy | None = None):
+        self.__authorization = authorization
+        self.__coalesce = coalesce
+        # Own client (e.g. from `create_client`), None to use the pool of the running event loop
+        # shared by all clients
+        self.__client = client
+        self.__max_retries = max_retries
+        # Default priority of requests, e.g. `Priority.BACKGROUND` for bulk jobs
+        self.__priority = priority
+        self.__rate_limiter = rate_limiter or RateLimiter.for_authorization(authorization)
+        self.__retry_policy = retry_policy or RetryPolicy()
+        # Responses depend on authorization, so caches are per instance and opt-in
+        self.__response_cache = response_cache
+        self.__user_agent = user_agent or __user_agent__
+
+    @staticmethod
+    async def _delete_batches(message_ids: Iterable[int | str] | AsyncIterable[int | str]):
+        """`REST._delete_batches` of IDs from an iterable or async iterable"""
+        if not isinstance(message_ids, AsyncIterable):
+            for batch in REST._delete_batches(message_ids):
+                yield batch
+
+            return
+
+        batch: dict[str, None] = {}
+
+        async for message_id in message_ids:
+            message_id = str(message_id)
+
+            if int(message_id) < from_timestamp(time() - REST.BULK_DELETE_MAX_AGE):
+                yield [message_id]
+                continue
+
+            batch[message_id] = None
+
+            if len(batch) == 100:
+                yield list(batch)
+                batch.clear()
+
+        if batch:
+            yield list(batch)
+
+    def _headers(self, headers: dict[str, str] | None = None):
+        headers = (headers or {}) | {"User-Agent": self.__user_agent}
+
+        if self.__authorization:
+            headers |= {"Authorization": self.__authorization}
+
+        return headers
+
+    @staticmethod
+    def _message_body(payload: dict[str, Any], uploads: list[UploadLike] | None,
+                      max_upload_size: int = Upload.MAX_SIZE):
+        """See `REST._message_body`, multipart forms are streamed asynchronously"""
+        content, headers = REST._message_body(payload, uploads, max_upload_size)
+
+        if isinstance(content, Multipart):
+            return content.async_chunks(), headers
+
+        return content, headers
+
+    async def _page(self, url: str, params: dict[str, Any], forward: bool,
+                    id_of: Callable[[Any], str],
+                    items_of: Callable[[Any], list[Any]] | None):
+        data = (await self._request("GET", url, params=params)).json()
+        items = data if items_of is None else items_of(data)
+        return sorted(items, key=lambda item: int(id_of(item)), reverse=not forward)
+
+    async def _paginate(self, url: str, page_size: int, forward: bool,
+                        id_of: Callable[[Any], str], cursor: int | str | datetime | None = None,
+                        limit: int | None = None, until: int | str | datetime | None = None,
+                        params: dict[str, Any] | None = None,
+                        items_of: Callable[[Any], list[Any]] | None = None):
+        """See `REST._paginate`, the next page is fetched in a task"""
+        cursor = REST._snowflake(cursor)
+        until = REST._snowflake(until)
+        cursor_param = "after" if forward else "before"
+        params = (params or {}) | {"limit": page_size}
+        count = 0
+
+        def reached(item_id: int):
+            return until is not None and (item_id >= until if forward else item_id <= until)
+
+        page = await self._page(url, params if cursor is None else params | {cursor_param: cursor},
+                                forward, id_of, items_of)
+        next_page = None
+
+        try:
+            while page:
+                last_id = int(id_of(page[-1]))
+
+                if len(page) == page_size and not reached(last_id) and \
+                        (limit is None or count + len(page) < limit):
+                    next_page = create_task(self._page(url, params | {cursor_param: last_id},
+                                                       forward, id_of, items_of))
+
+                else:
+                    next_page = None
+
+                for item in page:
+                    if reached(int(id_of(item))):
+                        return
+
+                    yield item
+                    count += 1
+
+                    if limit is not None and count >= limit:
+                        return
+
+                page = await next_page if next_page is not None else []
+                next_page = None
+
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def _request(self, method: str, url: str, priority: Priority | None = None,
+                       idempotent: bool | None = None, **kwargs):
+        kwargs["headers"] = self._headers(kwargs.get("headers"))
+        send = partial(AsyncREST._send, self.client, self.__rate_limiter, self.__max_retries,
+                       self.__priority if priority is None else priority, method, url,
+                       retry_policy=self.__retry_policy, idempotent=idempotent, **kwargs)
+
+        if method != "GET":
+            res = await send()
+
+            if self.__response_cache is not None:
+                self.__response_cache.invalidate(url)
+
+            return res
+
+        key = ResponseCache.key(url, kwargs.get("params"))
+
+        if self.__response_cache is not None:
+            res = self.__response_cache.get(key)
+
+            if res is not None:
+                return res
+
+        if self.__coalesce:
+            # Concurrent identical GETs share one request
+            res = await AsyncREST.__FLIGHTS.do((self.__authorization, key), send)
+
+        else:
+            res = await send()
+
+        if self.__response_cache is not None:
+            self.__response_cache.put(key, res)
+
+        return res
+
+    @staticmethod
+    async def _send(client: AsyncClient, rate_limiter: RateLimiter, max_retries: int,
+                    priority: Priority, method: str, url: str,
+                    retry_policy: RetryPolicy | None = None, idempotent: bool | None = None,
+                    **kwargs):
+        """Send request once rate limits allow it (served by priority), retrying up to
+        `max_retries` times when rate limited and as `retry_policy` allows on transient failures"""
+        route = RateLimiter.route(method, url)
+        retries = 0
+        # Attempt number for `retry_policy`, retries after 429 are counted by `retries` instead
+        attempt = 1
+        ticket = object()
+
+        if idempotent is None:
+            idempotent = method in RetryPolicy.IDEMPOTENT_METHODS
+
+        while True:
+            try:
+                while (delay := rate_limiter.acquire(route, priority, ticket)) > 0:
+                    await sleep(delay)
+
+            finally:
+                rate_limiter.release(ticket)
+
+            try:
+                res = await client.request(method, url, **kwargs)
+
+            except TransportError as exc:
+                if retry_policy is None or not retry_policy.retry(attempt, idempotent, error=exc):
+                    raise
+
+                AsyncREST.__LOGGER.warning(f"{method} {url} failed ({exc!r}), retrying!")
+                await sleep(retry_policy.backoff(attempt))
+                attempt += 1
+                continue
+
+            retry_after = rate_limiter.update(route, res)
+
+            if retry_after is None and retry_policy is not None:
+                if retry_policy.retry(attempt, idempotent, status_code=res.status_code):
+                    AsyncREST.__LOGGER.warning(f"{method} {url} failed with status code " +
+                                               f"{res.status_code}, retrying!")
+                    await sleep(retry_policy.backoff(attempt))
+                    attempt += 1
+                    continue
+
+                if res.status_code < 400:
+                    retry_policy.succeeded()
+
+            if retry_after is None or retries >= max_retries:
+                break
+
+            retries += 1
+            await sleep(retry_after)
+
+        if res.status_code >= 400:
+            raise RESTException(res)
+
+        return res
+
+    @staticmethod
+    def _shared_client():
+        """Shared pool of the running event loop, created on first use"""
+        loop = get_running_loop()
+        client = AsyncREST.__CLIENTS.get(loop)
+
+        if client is None:
+            # Connections of closed loops can't be used (or closed) anymore
+            for closed in [other for other in AsyncREST.__CLIENTS if other.is_closed()]:
+                del AsyncREST.__CLIENTS[closed]
+
+            client = AsyncREST.__CLIENTS[loop] = AsyncREST.create_client(
+                **AsyncREST.__POOL_OPTIONS)
+
+        return client
+
+    async def add_global_command(self, application_id: str, command: ApplicationCommand):
+        return await self._request("POST", f"applications/{application_id}/commands",
+                                   json=command)
+
+    async def add_guild_command(self, application_id: str, guild_id: str,
+                                command: ApplicationCommand):
+        return await self._request("POST",
+                                   f"applications/{application_id}/guilds/{guild_id}/commands",
+                                   json=command)
+
+    @staticmethod
+    async def close():
+        """Close shared connection pool of the running event loop, a new one is created on next
+        use"""
+        client = AsyncREST.__CLIENTS.pop(get_running_loop(), None)
+
+        if client is not None:
+            await client.aclose()
+
+    @classmethod
+    def configure_pool(cls, limits: Limits | None = None, timeout: Timeout | float | None = 5.0,
+                       http2: bool = h2_available):
+        """Configure connection pools shared by clients without their own client
+
+        Pools are created per event loop on first use, pools already created keep their
+        configuration until closed with `close`.
+        """
+        AsyncREST.__POOL_OPTIONS = {"limits": limits, "timeout": timeout, "http2": http2}
+
+    @staticmethod
+    def create_client(limits: Limits | None = None, timeout: Timeout | float | None = 5.0,
+                      http2: bool = h2_available):
+        """HTTP client for Discord API, pass as `client` to give an `AsyncREST` instance its own
+        connection pool, see `REST.create_client`"""
+        return AsyncClient(base_url=f"{AsyncREST.API_URL}/v{AsyncREST.VERSION}/",
+                           follow_redirects=True, http2=http2, limits=limits or Limits(),
+                           timeout=timeout)
+
+    async def create_dm_channel(self, recipient_id: str):
+        res = await self._request("POST", "users/@me/channels",
+                                  json={"recipient_id": recipient_id})
+        channel: Channel = res.json()
+        return channel
+
+    async def bulk_delete_messages(self, channel_id: str, message_ids: list[str]):
+        return await self._request("POST", f"channels/{channel_id}/messages/bulk-delete",
+                                   json={"messages": message_ids})
+
+    async def bulk_overwrite_global_commands(self, application_id: str,
+                                             commands: list[ApplicationCommand]):
+        return await self._request("PUT", f"applications/{application_id}/commands",
+                                   json=commands)
+
+    async def bulk_overwrite_guild_commands(self, application_id: str, guild_id: str,
+                                            commands: list[ApplicationCommand]):
+        return await self._request("PUT",
+                                   f"applications/{application_id}/guilds/{guild_id}/commands",
+                                   json=commands)
+
+    async def delete_global_command(self, application_id: str, command_id: str):
+        return await self._request("DELETE",
+                                   f"applications/{application_id}/commands/{command_id}")
+
+    async def delete_guild_command(self, application_id: str, guild_id: str, command_id: str):
+        return await self._request("DELETE", f"applications/{application_id}/guilds/" +
+                                   f"{guild_id}/commands/{command_id}")
+
+    async def delete_message(self, channel_id: str, message_id: str):
+        return await self._request("DELETE", f"channels/{channel_id}/messages/{message_id}")
+
+    async def delete_messages(self, channel_id: str,
+                              message_ids: Iterable[int | str] | AsyncIterable[int | str],
+                              priority: Priority = Priority.BACKGROUND, max_concurrency: int = 4):
+        """Delete messages of channel concurrently, see `REST.delete_messages`, `message_ids` can
+        also be an async iterable such as IDs of `iter_messages`"""
+        tasks: dict[Task, list[str]] = {}
+
+        async def completed():
+            done, _ = await wait(tasks, return_when=FIRST_COMPLETED)
+            return [(tasks.pop(task), task.exception() or task.result()) for task in done]
+
+        try:
+            async for batch in AsyncREST._delete_batches(message_ids):
+                method, url, json = REST._delete_request(channel_id, batch)
+                tasks[create_task(self._request(method, url, priority=priority,
+                                                json=json))] = batch
+
+                while len(tasks) >= max_concurrency:
+                    for result in await completed():
+                        yield result
+
+            while tasks:
+                for result in await completed():
+                    yield result
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_gateway(self):
+        res = await self._request("GET", "gateway")
+        data: GetGatewayResponse = res.json()
+        return data
+
+    async def get_global_command(self, application_id: str, command_id: str):
+        return await self._request("GET", f"applications/{application_id}/commands/{command_id}")
+
+    async def get_global_commands(self, application_id: str,
+                                  with_localizations: bool | None = None):
+        res = await self._request("GET", f"applications/{application_id}/commands",
+                                  params=REST._params(with_localizations=with_localizations))
+
+        return res
+
+    async def get_guild_command(self, application_id: str, guild_id: str, command_id: str):
+        res = await self._request("GET", f"applications/{application_id}/guilds/{guild_id}/" +
+                                  f"commands/{command_id}")
+
+        return res
+
+    async def get_guild_commands(self, application_id: str, guild_id: str,
+                                 with_localizations: bool | None = None):
+        res = await self._request("GET",
+                                  f"applications/{application_id}/guilds/{guild_id}/commands",
+                                  params=REST._params(with_localizations=with_localizations))
+
+        return res
+
+    async def interaction_response(self, interaction: Interaction,
+                                   callback: InteractionResponse):
+        res = await self._request("POST", f"interactions/{interaction['id']}/" +
+                                  f"{interaction['token']}/callback", json=callback,
+                                  priority=Priority.INTERACTION)
+
+        return res
+
+    def iter_audit_log_entries(self, guild_id: str, before: int | str | datetime | None = None,
+                               until: int | str | datetime | None = None,
+                               limit: int | None = None, user_id: str | None = None,
+                               action_type: int | None = None):
+        return self._paginate(f"guilds/{guild_id}/audit-logs", 100, False,
+                              lambda entry: entry["id"], cursor=before, limit=limit, until=until,
+                              params=REST._params(user_id=user_id, action_type=action_type),
+                              items_of=lambda data: data["audit_log_entries"])
+
+    def iter_guild_bans(self, guild_id: str, after: int | str | datetime | None = None,
+                        until: int | str | datetime | None = None, limit: int | None = None):
+        bans: AsyncIterator[Ban] = self._paginate(f"guilds/{guild_id}/bans", 1000, True,
+                                                  lambda ban: ban["user"]["id"],
+                                                  cursor=after or 0, limit=limit, until=until)
+        return bans
+
+    def iter_guild_members(self, guild_id: str, after: int | str | datetime | None = None,
+                           until: int | str | datetime | None = None, limit: int | None = None):
+        members: AsyncIterator[GuildMember] = self._paginate(f"guilds/{guild_id}/members", 1000,
+                                                             True,
+                                                             lambda member: member["user"]["id"],
+                                                             cursor=after or 0, limit=limit,
+                                                             until=until)
+        return members
+
+    def iter_messages(self, channel_id: str, before: int | str | datetime | None = None,
+                      after: int | str | datetime | None = None,
+                      until: int | str | datetime | None = None, limit: int | None = None):
+        forward = after is not None and before is None
+        messages: AsyncIterator[Message] = self._paginate(f"channels/{channel_id}/messages", 100,
+                                                          forward, lambda message: message["id"],
+                                                          cursor=after if forward else before,
+                                                          limit=limit, until=until)
+        return messages
+
+    def iter_reactions(self, channel_id: str, message_id: str, emoji: str,
+                       after: int | str | datetime | None = None,
+                       until: int | str | datetime | None = None, limit: int | None = None):
+        users: AsyncIterator[User] = self._paginate(f"channels/{channel_id}/messages/" +
+                                                    f"{message_id}/reactions/{quote(emoji)}", 100,
+                                                    True, lambda user: user["id"],
+                                                    cursor=after or 0, limit=limit, until=until)
+        return users
+
+    async def post_message(self, channel_id: str, content: str | None = None,
+                           tts: bool | None = None, embeds: list[Embed] | None = None,
+                           allowed_mentions: AllowedMentions | None = None,
+                           message_reference: MessageReference | None = None,
+                           components: list[ActionRowComponent] | None = None,
+                           sticker_ids: list[str] | None = None, flags: MessageFlag | None = None,
+                           attachments: list[Attachment] | None = None,
+                           uploads: list[UploadLike] | None = None,
+                           nonce: str | None = None, max_upload_size: int = Upload.MAX_SIZE):
+        """Create message in channel, see `REST.post_message`"""
+        assert content or embeds or sticker_ids or components or uploads
+
+        payload = REST._message_payload(content=content, tts=tts, embeds=embeds,
+                                        allowed_mentions=allowed_mentions,
+                                        message_reference=message_reference,
+                                        components=components, sticker_ids=sticker_ids,
+                                        flags=flags, attachments=attachments,
+                                        nonce=nonce or REST.random_nonce(), enforce_nonce=True)
+        content, headers = AsyncREST._message_body(payload, uploads, max_upload_size)
+        res = await self._request("POST", f"channels/{channel_id}/messages", idempotent=True,
+                                  content=content, headers=headers)
+
+        return res
+
+    @staticmethod
+    async def post_webhook_message(webhook_id: str, webhook_token: str,
+                                   content: str | None = None, username: str | None = None,
+                                   avatar_url: str | None = None, tts: bool | None = None,
+                                   embeds: list[Embed] | None = None,
+                                   allowed_mentions: AllowedMentions | None = None,
+                                   components: list[ActionRowComponent] | None = None,
+                                   flags: MessageFlag | None = None,
+                                   attachments: list[Attachment] | None = None,
+                                   uploads: list[UploadLike] | None = None,
+                                   wait: bool | None = None, thread_id: str | None = None,
+                                   user_agent: str | None = None, max_retries: int = 3,
+                                   client: AsyncClient | None = None,
+                                   priority: Priority = Priority.USER,
+                                   max_upload_size: int = Upload.MAX_SIZE):
+        assert content or embeds or components or uploads
+
+        payload = REST._message_payload(content=content, username=username,
+                                        avatar_url=avatar_url, tts=tts, embeds=embeds,
+                                        allowed_mentions=allowed_mentions, components=components,
+                                        flags=flags, attachments=attachments)
+        content, headers = AsyncREST._message_body(payload, uploads, max_upload_size)
+
+        # Webhook requests aren't authorized by a token, their limits are shared
+        res = await AsyncREST._send(client or AsyncREST._shared_client(),
+                                    RateLimiter.for_authorization(None), max_retries, priority,
+                                    "POST",
+                                    f"webhooks/{webhook_id}/{webhook_token}",
+                                    params=REST._params(wait=wait, thread_id=thread_id),
+                                    headers=headers | {"User-Agent": user_agent or __user_agent__},
+                                    content=content)
+
+        return res
+
+    @staticmethod
+    async def post_webhook_messages(webhooks: Iterable[tuple[str, str]],
+                                    content: str | None = None, username: str | None = None,
+                                    avatar_url: str | None = None, tts: bool | None = None,
+                                    embeds: list[Embed] | None = None,
+                                    allowed_mentions: AllowedMentions | None = None,
+                                    components: list[ActionRowComponent] | None = None,
+                                    flags: MessageFlag | None = None,
+                                    attachments: list[Attachment] | None = None,
+                                    uploads: list[UploadLike] | None = None,
+                                    wait: bool | None = None, user_agent: str | None = None,
+                                    max_retries: int = 3, client: AsyncClient | None = None,
+                                    priority: Priority = Priority.BACKGROUND,
+                                    max_concurrency: int = 64,
+                                    retry_policy: RetryPolicy | None = None,
+                                    max_upload_size: int = Upload.MAX_SIZE):
+        """Post the same message to every `(webhook ID, webhook token)` pair concurrently, see
+        `REST.post_webhook_messages`"""
+        assert content or embeds or components or uploads
+
+        payload = REST._message_payload(content=content, username=username,
+                                        avatar_url=avatar_url, tts=tts, embeds=embeds,
+                                        allowed_mentions=allowed_mentions, components=components,
+                                        flags=flags, attachments=attachments)
+        body, headers = AsyncREST._message_body(payload, uploads, max_upload_size)
+        headers |= {"User-Agent": user_agent or __user_agent__}
+        send = partial(AsyncREST._send, client or AsyncREST._shared_client(),
+                       RateLimiter.for_authorization(None), max_retries, priority,
+                       retry_policy=retry_policy or RetryPolicy(), content=body, headers=headers,
+                       params=REST._params(wait=wait))
+        semaphore = Semaphore(max_concurrency)
+
+        async def post(webhook_id: str, webhook_token: str):
+            async with semaphore:
+                try:
+                    return webhook_id, await send("POST", f"webhooks/{webhook_id}/{webhook_token}")
+
+                except Exception as exc:
+                    return webhook_id, exc
+
+        tasks = [create_task(post(webhook_id, webhook_token))
+                 for webhook_id, webhook_token in webhooks]
+
+        try:
+            for task in as_completed(tasks):
+                yield await task
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def sync_commands(self, application_id: str, commands: list[ApplicationCommand],
+                            guild_id: str | None = None, known_hash: str | None = None):
+        """Make registered global (or guild if `guild_id` set) commands match `commands`, see
+        `REST.sync_commands`"""
+        commands_hash = REST.commands_hash(commands, guild=guild_id is not None)
+
+        if commands_hash == known_hash:
+            return commands_hash
+
+        if guild_id is not None:
+            res = await self.get_guild_commands(application_id, guild_id,
+                                                with_localizations=True)
+
+        else:
+            res = await self.get_global_commands(application_id, with_localizations=True)
+
+        for method, url, json in REST._command_changes(application_id, guild_id, commands,
+                                                       res.json()):
+            AsyncREST.__LOGGER.info(f"Syncing commands: {method} {url}")
+            await self._request(method, url, json=json, priority=Priority.BACKGROUND)
+
+        return commands_hash
+
+    async def update_global_command(self, application_id: str, command_id: str,
+                                    command: ApplicationCommand):
+        res = await self._request("PATCH",
+                                  f"applications/{application_id}/commands/{command_id}",
+                                  json=command)
+
+        return res
+
+    async def update_guild_command(self, application_id: str, guild_id: str, command_id: str,
+                                   command: ApplicationCommand):
+        res = await self._request("PATCH", f"applications/{application_id}/guilds/{guild_id}/" +
+                                  f"commands/{command_id}", json=command)
+
+        return res
+
+    @classmethod
+    def with_bot_token(cls, token: str, user_agent: str | None = None, **kwargs):
+        """Client authorized with bot token, remaining arguments are passed to the constructor"""
+        return cls(f"Bot {token}", user_agent=user_agent, **kwargs)
+
+    @property
+    def client(self):
+        """Own client, or the shared pool of the running event loop if there is none"""
+        return self.__client if self.__client is not None else AsyncREST._shared_client()
+
+    @property
+    def coalesce(self):
+        return self.__coalesce
+
+    @property
+    def priority(self):
+        return self.__priority
+
+    @property
+    def rate_limiter(self):
+        return self.__rate_limiter
+
+    @property
+    def retry_policy(self):
+        return self.__retry_policy
+
+    @property
+    def response_cache(self):
+        return self.__response_cache
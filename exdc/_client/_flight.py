@@ -0,0 +1,105 @@
+from __future__ import annotations
+from asyncio import AbstractEventLoop, get_running_loop, shield, Task
+from concurrent.futures import Future
+from threading import Lock
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key from multiple threads, only the first caller
+    runs the call, the others wait for and share its result (or exception)"""
+
+    def __init__(self):
+        self.__calls: dict[Hashable, Future] = {}
+        self.__coalesced = 0
+        self.__lock = Lock()
+
+    def do(self, key: Hashable, call: Callable[[], T]) -> T:
+        with self.__lock:
+            future = self.__calls.get(key)
+            leader = future is None
+
+            if leader:
+                future = self.__calls[key] = Future()
+
+            else:
+                self.__coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = call()
+            future.set_result(result)
+            return result
+
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+
+    @property
+    def coalesced(self):
+        """Number of calls which shared the result of an in-flight call"""
+        return self.__coalesced
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent calls with the same key on the same event loop, see `SingleFlight`
+
+    The call runs in its own task which callers wait for shielded, so cancelling a caller only
+    cancels its wait. The call is cancelled once every caller waiting for it was cancelled.
+    """
+
+    def __init__(self):
+        self.__calls: dict[AbstractEventLoop, dict[Hashable, _Flight]] = {}
+        self.__coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        loop = get_running_loop()
+        calls = self.__calls.setdefault(loop, {})
+        flight = calls.get(key)
+
+        if flight is None:
+            flight = calls[key] = _Flight(loop.create_task(call()))
+
+            def done(_: Task):
+                if calls.get(key) is flight:
+                    del calls[key]
+
+                if not calls and self.__calls.get(loop) is calls:
+                    del self.__calls[loop]
+
+            flight.task.add_done_callback(done)
+
+        else:
+            self.__coalesced += 1
+
+        flight.waiters += 1
+
+        try:
+            return await shield(flight.task)
+
+        finally:
+            flight.waiters -= 1
+
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    @property
+    def coalesced(self):
+        """Number of calls which shared the result of an in-flight call"""
+        return self.__coalesced
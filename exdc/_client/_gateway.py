@@ -10,21 +10,23 @@ from zlib import decompressobj
 
 from websocket import ABNF, create_connection, WebSocketTimeoutException
 
+from ._intern import Interner
+from ._response_cache import ResponseCache
 from ._rest import REST
 from .._consts import __user_agent__
 from ..exception import GatewayNotConnectedException, GatewayReceiveTimeout
-from ..type.gateway import DispatchPayload, HeartbeatPayload, IdentifyData, IdentifyPayload, \
-    IdentifyProperties, Operation, PresenceUpdateData, PresenceUpdatePayload, ReadyEventData, \
-    ReceiveEvent, ResumeData, ResumePayload
+from ..type.gateway import DispatchPayload, GatewaySession, HeartbeatPayload, IdentifyData, \
+    IdentifyPayload, IdentifyProperties, Operation, PresenceUpdateData, PresenceUpdatePayload, \
+    ReadyEventData, ReceiveEvent, ResumeData, ResumePayload
 
 
 class Gateway:
     """Client to communicate with Discord Gateway"""
 
     VERSION = 10
-    __REST_CLIENT = REST()
+    # Gateway URL rarely changes, so it is only fetched again once the cached response expires
+    __REST_CLIENT = REST(response_cache=ResponseCache(max_size=1, ttl=3600))
     __LOGGER = getLogger("exdc.Gateway")
-    __URL = None
 
     def __enter__(self):
         # Check make sure there is a valid connection when context manager is entered
@@ -41,16 +43,21 @@ class Gateway:
         self._close(status=1000)
 
     def __init__(self, token: str, intents: int, presence_update: PresenceUpdateData | None = None,
-                 timeout: int = 3, user_agent: str | None = None):
+                 timeout: int = 3, user_agent: str | None = None,
+                 session: GatewaySession | None = None, interner: Interner | None = None):
         self.__first_hb_at = None
         self.__hb_interval_ms = None
         self.__intents = intents
+        self.__interner = interner
         self.__jitter = uniform(0, 1)
         self.__last_hb_ack = None
         self.__last_hb_sent = None
         self.__presence_update = presence_update
         self.__ready_event_data = None
-        self.__sequence = None
+        self.__sequence = session["seq"] if session else None
+        self.__session = {"session_id": session["session_id"],
+                          "resume_gateway_url": session["resume_gateway_url"]} \
+            if session else None
         self.__timeout = timeout
         self.__token = token
         self.__user_agent = user_agent
@@ -79,6 +86,7 @@ class Gateway:
             # If non resumable status, clear all session variables
             self.__ready_event_data = None
             self.__sequence = None
+            self.__session = None
             self.__ws = None
 
         self.__zlib_ctx = None
@@ -96,17 +104,11 @@ class Gateway:
                                   "Closing previous connection!")
             self._close(status=1000)
 
-        # If gateway URL hasn't been cached
-        if not Gateway.__URL:
-            # GET it from REST client and cache it
-            Gateway.__LOGGER.info("Gateway URL not cached! Attempting to get gateway URL!")
-            gateway_data = Gateway.__REST_CLIENT.get_gateway()
-            Gateway.__URL = gateway_data["url"]
-            Gateway.__LOGGER.info(f"Gateway URL: {Gateway.__URL}")
+        gateway_url = Gateway.__REST_CLIENT.get_gateway()["url"]
 
         # Create a new gateway connection with zlib transport stream compression
         params = {"v": self.VERSION, "encoding": "json", "compress": "zlib-stream"}
-        self.__ws = create_connection(f"{Gateway.__URL}?{urlencode(params)}",
+        self.__ws = create_connection(f"{gateway_url}?{urlencode(params)}",
                                       timeout=self.__timeout,
                                       header={"User-Agent": self.__user_agent or __user_agent__},
                                       skip_utf8_validation=True)
@@ -203,14 +205,22 @@ class Gateway:
                     print(data)
                     raise ValueError(f"Received unexpected opcode {opcode}!")
 
-                payload = loads(data)
+                # Deduplicate repeated payload values while decoding if interning is enabled
+                payload = loads(data, object_hook=self.__interner)
 
                 if payload["op"] == Operation.DISPATCH:
                     dispatch_payload: DispatchPayload = payload
 
+                    if payload["s"] is not None:
+                        self.__sequence = payload["s"]
+
                     if payload["t"] == ReceiveEvent.READY:
                         ready_event_data: ReadyEventData = payload["d"]
                         self.__ready_event_data = ready_event_data
+                        self.__session = {
+                            "session_id": ready_event_data["session_id"],
+                            "resume_gateway_url": ready_event_data["resume_gateway_url"],
+                        }
 
                     return dispatch_payload["t"], dispatch_payload["d"]
 
@@ -270,15 +280,15 @@ class Gateway:
 
     def _resume(self):
         """Resume existing gateway connection"""
-        assert self.__ready_event_data and self.__zlib_ctx
+        assert self.__session
 
-        resume_gateway_url = self.__ready_event_data["resume_gateway_url"]
+        resume_gateway_url = self.__session["resume_gateway_url"]
         params = {"v": self.VERSION, "encoding": "json", "compress": "zlib-stream"}
         self.__ws = create_connection(f"{resume_gateway_url}?{urlencode(params)}",
                                       timeout=self.__timeout, skip_utf8_validation=True,
                                       header={"User-Agent": self.__user_agent or __user_agent__})
         self.__zlib_ctx = decompressobj()
-        session_id = self.__ready_event_data["session_id"]
+        session_id = self.__session["session_id"]
         Gateway.__LOGGER.info("Sending resume payload!")
         self._send(dumps(ResumePayload(op=Operation.RESUME, d=ResumeData(token=self.__token,
                                                                          session_id=session_id,
@@ -292,11 +302,23 @@ class Gateway:
 
         self.__ws.send(payload)
 
+    def suspend(self):
+        """Close gateway connection without invalidating the session, returns the session data
+        needed to resume it later"""
+        session = self.session
+        self._close(status=1011)
+        return session
+
     @property
     def connected(self):
         """Gatway client connection status"""
         return self.__ws is not None and self.__ws.connected
 
+    @property
+    def interner(self):
+        """Interner deduplicating decoded payload values, None if interning is disabled"""
+        return self.__interner
+
     @property
     def presence_update(self):
         """Gateway client presence update status"""
@@ -310,5 +332,16 @@ class Gateway:
 
     @property
     def ready(self):
-        """Check if gateway client received READY event from gateway"""
-        return self.__ready_event_data is not None
+        """Check if gateway client has a session to resume (received READY event from gateway or
+        was created with session data)"""
+        return self.__session is not None
+
+    @property
+    def session(self):
+        """Data needed to resume the current session later (e.g. after a restart), pass it as
+        `session` when creating a new client to resume instead of identifying again"""
+        if self.__session is None:
+            return None
+
+        session: GatewaySession = self.__session | {"seq": self.__sequence}
+        return session
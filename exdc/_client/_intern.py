@@ -0,0 +1,79 @@
+from __future__ import annotations
+from typing import Any, Iterable
+
+
+class Interner:
+    """Deduplicates repeated string values while gateway payloads are decoded
+
+    Used as `object_hook` for decoding, every str value (or str item of a list value) of the
+    configured keys is replaced by the first equal string seen, so cached entities share one copy
+    of it. Each key has its own table holding at most `max_size` strings, once full the least
+    recently seen string is evicted for a new one, so one-off values don't stay pinned.
+    """
+
+    DEFAULT_KEYS = ("avatar", "banner", "desktop", "discriminator", "icon", "large_image",
+                    "locale", "mobile", "name", "preferred_locale", "roles", "small_image",
+                    "status", "web")
+
+    def __init__(self, keys: Iterable[str] = DEFAULT_KEYS, max_size: int = 100000):
+        self.__hits = 0
+        self.__keys = frozenset(keys)
+        self.__max_size = max_size
+        self.__misses = 0
+        self.__tables: dict[str, dict[str, str]] = {key: {} for key in self.__keys}
+
+    def __call__(self, obj: dict[str, Any]):
+        for key in self.__keys.intersection(obj):
+            value = obj[key]
+
+            if isinstance(value, str):
+                obj[key] = self._intern(self.__tables[key], value)
+
+            elif isinstance(value, list) and value and isinstance(value[0], str):
+                table = self.__tables[key]
+                obj[key] = [self._intern(table, item) for item in value]
+
+        return obj
+
+    def _intern(self, table: dict[str, str], value: str):
+        interned = table.get(value)
+
+        if interned is not None:
+            self.__hits += 1
+            # Move to the end, tables are ordered from least to most recently seen
+            del table[interned]
+            table[interned] = interned
+            return interned
+
+        self.__misses += 1
+
+        if len(table) >= self.__max_size:
+            del table[next(iter(table))]
+
+        table[value] = value
+        return value
+
+    def clear(self):
+        for table in self.__tables.values():
+            table.clear()
+
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.__hits + self.__misses
+        return self.__hits / lookups if lookups else 0.0
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
+
+    @property
+    def sizes(self):
+        """Number of interned strings per key"""
+        return {key: len(table) for key, table in self.__tables.items()}
@@ -0,0 +1,280 @@
+from __future__ import annotations
+from enum import IntEnum
+from json import JSONDecodeError
+from logging import getLogger
+from math import inf
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable
+
+from httpx import Response
+
+Route = tuple[str, str | None]
+
+
+class Bucket:
+    """Known state of a Discord rate limit bucket"""
+
+    __slots__ = ("limit", "remaining", "reset_at", "window")
+
+    def __init__(self, limit: int, remaining: int, reset_at: float, window: float):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.window = window
+
+
+class Priority(IntEnum):
+    """Priority class of a request, lower values are served first"""
+    INTERACTION = 0
+    USER = 1
+    BACKGROUND = 2
+
+
+class RateLimiter:
+    """Tracks Discord REST rate limits of one token
+
+    Requests are mapped to routes (method and path with IDs and tokens replaced) and their major
+    parameter (channel, guild or webhook), routes to the buckets reported in `X-RateLimit-Bucket`
+    and buckets are kept per major parameter. Buckets past their reset are dropped every
+    `SWEEP_INTERVAL` seconds. `acquire` doesn't block, it returns how long the caller has to wait
+    before sending, so it can be shared by sync and async clients.
+
+    Waiting requests are served by `Priority`, a request yields to any higher priority request
+    waiting on the same bucket or on the global limit.
+    """
+
+    MAJOR_PARAMS = ("channels", "guilds", "webhooks")
+    # How often buckets past their reset are dropped, a reset bucket carries no information
+    SWEEP_INTERVAL = 60.0
+    # How long a request yielding to a higher priority one waits before trying again
+    YIELD_DELAY = 0.05
+    __LOGGER = getLogger("exdc.RateLimiter")
+    # Rate limits are tracked per token, shared by all clients using it
+    __SHARED: dict[str | None, RateLimiter] = {}
+
+    def __init__(self, global_limit: int | None = 50, clock: Callable[[], float] = monotonic):
+        self.__buckets: dict[tuple[str, str | None], Bucket] = {}
+        self.__clock = clock
+        self.__global_count = 0
+        self.__global_limit = global_limit
+        self.__global_reset_at = 0.0
+        self.__global_window_start = 0.0
+        self.__lock = Lock()
+        self.__next_sweep = clock() + RateLimiter.SWEEP_INTERVAL
+        self.__routes: dict[str, str] = {}
+        self.__waiting: dict[object, tuple[Priority, Any]] = {}
+
+    def _bucket_key(self, route: Route):
+        route_key, major = route
+        return self.__routes.get(route_key, route_key), major
+
+    def _delay(self, key: tuple[str, str | None], is_global: bool, now: float):
+        """Seconds until a request may be sent and what it waits on (bucket key or "global")"""
+        if self.__global_reset_at > now:
+            return self.__global_reset_at - now, "global"
+
+        if is_global:
+            if now - self.__global_window_start >= 1:
+                self.__global_window_start = now
+                self.__global_count = 0
+
+            elif self.__global_count >= self.__global_limit:
+                return self.__global_window_start + 1 - now, "global"
+
+        bucket = self.__buckets.get(key)
+
+        if bucket is not None and bucket.reset_at > now and bucket.remaining <= 0:
+            return bucket.reset_at - now, key
+
+        return 0.0, None
+
+    @staticmethod
+    def _retry_after(res: Response):
+        try:
+            data = res.json()
+
+        except (JSONDecodeError, UnicodeDecodeError):
+            # Cloudflare bans respond with HTML
+            data = {}
+
+        if not isinstance(data, dict):
+            data = {}
+
+        retry_after = data.get("retry_after", res.headers.get("Retry-After", 1))
+        is_global = data.get("global", False) or \
+            res.headers.get("X-RateLimit-Global", "").lower() == "true"
+        return float(retry_after), is_global
+
+    def _sweep(self, now: float):
+        """Drop buckets past their reset, so buckets of majors no longer used don't pile up"""
+        for key in [key for key, bucket in self.__buckets.items() if bucket.reset_at <= now]:
+            del self.__buckets[key]
+
+        self.__next_sweep = now + RateLimiter.SWEEP_INTERVAL
+
+    def _yield_to(self, priority: Priority, blockers: tuple[Any, ...], ticket: object | None):
+        """Blocker of a higher priority request waiting on any of `blockers`, None if none is"""
+        for waiting_ticket, (waiting_priority, blocker) in self.__waiting.items():
+            if waiting_priority < priority and blocker in blockers and \
+                    waiting_ticket is not ticket:
+                return blocker
+
+        return None
+
+    def acquire(self, route: Route, priority: Priority = Priority.USER,
+                ticket: object | None = None):
+        """Reserve a request on route, returns 0 if it may be sent now, otherwise the seconds to
+        wait before calling `acquire` again
+
+        Callers pass the same `ticket` (any unique object) to every `acquire` of a request so it
+        is known to be waiting, and `release` it if they give up.
+        """
+        with self.__lock:
+            now = self.__clock()
+            key = self._bucket_key(route)
+            # Interaction callbacks aren't bound to the global rate limit
+            is_global = self.__global_limit is not None and \
+                not route[0].split(" ", 1)[1].startswith("interactions/")
+            delay, blocker = self._delay(key, is_global, now)
+
+            if delay == 0:
+                blocker = self._yield_to(priority, (key, "global") if is_global else (key,),
+                                         ticket)
+
+                if blocker is not None:
+                    delay = RateLimiter.YIELD_DELAY
+
+            if delay > 0:
+                if ticket is not None:
+                    self.__waiting[ticket] = (priority, blocker)
+
+                return delay
+
+            if ticket is not None:
+                self.__waiting.pop(ticket, None)
+
+            bucket = self.__buckets.get(key)
+
+            if bucket is not None:
+                if bucket.reset_at <= now:
+                    bucket.remaining = bucket.limit
+                    bucket.reset_at = now + bucket.window
+
+                bucket.remaining -= 1
+
+            if is_global:
+                self.__global_count += 1
+
+            return 0.0
+
+    def clear(self):
+        with self.__lock:
+            self.__buckets.clear()
+            self.__global_count = 0
+            self.__global_reset_at = 0.0
+            self.__routes.clear()
+
+    @classmethod
+    def for_authorization(cls, authorization: str | None):
+        """Rate limiter shared by all clients using authorization (None for webhooks)"""
+        return cls.__SHARED.setdefault(authorization, cls())
+
+    def release(self, ticket: object):
+        """Stop tracking request of ticket as waiting"""
+        with self.__lock:
+            self.__waiting.pop(ticket, None)
+
+    @classmethod
+    def route(cls, method: str, url: str):
+        """Route of request, `(route key, major parameter)`"""
+        parts = url.split("?", 1)[0].strip("/").split("/")
+        segments = list(parts)
+        major = None
+
+        for index, segment in enumerate(parts):
+            previous = parts[index - 1] if index else None
+
+            if previous in cls.MAJOR_PARAMS and major is None and segment.isdigit():
+                # Buckets are kept per major parameter, routes are the same for all of them
+                major = f"{previous}/{segment}"
+                segments[index] = ":id"
+
+            elif major is not None and index >= 2 and parts[index - 2] == "webhooks" and \
+                    major == f"webhooks/{previous}":
+                # Webhook token is part of the major parameter
+                major = f"{major}/{segment}"
+                segments[index] = ":token"
+
+            elif segment.isdigit():
+                segments[index] = ":id"
+
+            elif previous is not None and previous.isdigit() and index >= 2 and \
+                    parts[index - 2] == "interactions":
+                segments[index] = ":token"
+
+            elif previous == "reactions":
+                segments[index] = ":emoji"
+
+        return f"{method.upper()} {'/'.join(segments)}", major
+
+    def update(self, route: Route, res: Response):
+        """Update buckets from response headers, returns seconds to wait before retrying if
+        request was rate limited, None otherwise"""
+        headers = res.headers
+
+        with self.__lock:
+            now = self.__clock()
+            bucket_hash = headers.get("X-RateLimit-Bucket")
+
+            if now >= self.__next_sweep:
+                self._sweep(now)
+
+            if bucket_hash is not None:
+                self.__routes[route[0]] = bucket_hash
+
+            key = self._bucket_key(route)
+            bucket = self.__buckets.get(key)
+
+            if "X-RateLimit-Limit" in headers:
+                limit = int(headers["X-RateLimit-Limit"])
+                remaining = int(headers.get("X-RateLimit-Remaining", limit))
+                reset_after = float(headers.get("X-RateLimit-Reset-After", 0))
+
+                if bucket is None:
+                    bucket = self.__buckets[key] = Bucket(limit, remaining, now + reset_after,
+                                                          reset_after)
+
+                else:
+                    bucket.limit = limit
+                    bucket.remaining = remaining
+                    bucket.reset_at = now + reset_after
+                    bucket.window = max(bucket.window, reset_after)
+
+            if res.status_code != 429:
+                return None
+
+            retry_after, is_global = self._retry_after(res)
+
+            if is_global:
+                RateLimiter.__LOGGER.warning("Hit global rate limit, retrying after " +
+                                             f"{retry_after}s!")
+                self.__global_reset_at = max(self.__global_reset_at, now + retry_after)
+
+            else:
+                RateLimiter.__LOGGER.warning(f"Hit rate limit on {route[0]}, retrying after " +
+                                             f"{retry_after}s!")
+
+                if headers.get("X-RateLimit-Scope") != "shared":
+                    if bucket is None:
+                        bucket = self.__buckets[key] = Bucket(1, 0, inf, retry_after)
+
+                    bucket.remaining = 0
+                    bucket.reset_at = now + retry_after
+
+            return retry_after
+
+    @property
+    def global_reset_after(self):
+        """Seconds until global rate limit is lifted, 0 if not limited"""
+        return max(self.__global_reset_at - self.__clock(), 0.0)
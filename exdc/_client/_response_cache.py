@@ -0,0 +1,92 @@
+from __future__ import annotations
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable
+
+from httpx import Response
+
+CacheKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+class ResponseCache:
+    """Size bounded TTL cache of successful REST GET responses
+
+    Entries are evicted least recently used first once `max_size` is reached. Writes to a path
+    invalidate cached responses of the path, of its parent collections (e.g. a command list when
+    a command is updated) and of everything below it.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0,
+                 clock: Callable[[], float] = monotonic):
+        self.__clock = clock
+        self.__entries: OrderedDict[CacheKey, tuple[float, Response]] = OrderedDict()
+        self.__hits = 0
+        self.__lock = Lock()
+        self.__max_size = max_size
+        self.__misses = 0
+        self.__ttl = ttl
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @staticmethod
+    def _path(url: str):
+        return url.split("?", 1)[0].strip("/")
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__hits = 0
+            self.__misses = 0
+
+    def get(self, key: CacheKey):
+        """Cached response, None if there is none or it expired"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+            if entry is None or entry[0] <= self.__clock():
+                if entry is not None:
+                    del self.__entries[key]
+
+                self.__misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return entry[1]
+
+    def invalidate(self, url: str):
+        """Drop cached responses affected by a write to url"""
+        path = f"{ResponseCache._path(url)}/"
+
+        with self.__lock:
+            for key in [key for key in self.__entries
+                        if path.startswith(f"{key[0]}/") or key[0].startswith(path)]:
+                del self.__entries[key]
+
+    @staticmethod
+    def key(url: str, params: dict[str, Any] | None = None):
+        return ResponseCache._path(url), \
+            tuple(sorted((name, str(value)) for name, value in (params or {}).items()))
+
+    def put(self, key: CacheKey, res: Response, ttl: float | None = None):
+        with self.__lock:
+            self.__entries[key] = (self.__clock() + (ttl if ttl is not None else self.__ttl), res)
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+
+    @property
+    def hit_rate(self):
+        lookups = self.__hits + self.__misses
+        return self.__hits / lookups if lookups else 0.0
+
+    @property
+    def hits(self):
+        return self.__hits
+
+    @property
+    def misses(self):
+        return self.__misses
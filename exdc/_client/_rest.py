@@ -1,20 +1,34 @@
+from concurrent.futures import as_completed, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from functools import partial
+from hashlib import sha256
 from json import dumps
 from logging import getLogger
-from mimetypes import guess_type
-from pathlib import Path
 from random import randint
-from typing import IO
-
-from httpx import Client
-
+from threading import Lock
+from time import sleep, time
+from typing import Any, Callable, Iterable
+from urllib.parse import quote
+
+from httpx import Client, Limits, Timeout, TransportError
+
+from ._flight import SingleFlight
+from ._ratelimit import Priority, RateLimiter
+from ._response_cache import ResponseCache
+from ._retry import RetryPolicy
+from ._upload import Multipart, Upload, UploadLike
 from .._consts import __user_agent__
 from ..exception import RESTException
-from ..type.channel import AllowedMentions, Attachment, Channel, Embed, MessageFlag, \
+from ..snowflake import from_datetime, from_timestamp
+from ..type.channel import AllowedMentions, Attachment, Channel, Embed, Message, MessageFlag, \
     MessageReference
+from ..type.guild import Ban, GuildMember
 from ..type.interactions import Interaction, InteractionResponse
-from ..type.interactions.application_command import ApplicationCommand
+from ..type.interactions.application_command import ApplicationCommand, \
+    ApplicationCommandOption, ApplicationCommandType
 from ..type.interactions.message_component import ActionRowComponent
 from ..type.rest import GetGatewayResponse
+from ..type.user import User
 
 try:
     import h2  # noqa: F401
@@ -27,39 +41,396 @@ except ImportError:
 class REST:
     API_URL = "https://discord.com/api"
     VERSION = 10
+    # Fields of application commands set by clients, the rest is assigned by Discord
+    COMMAND_FIELDS = ("type", "name", "name_localizations", "description",
+                      "description_localizations", "options", "default_member_permissions",
+                      "dm_permission", "nsfw")
+    COMMAND_DEFAULTS = {"type": ApplicationCommandType.CHAT_INPUT, "name_localizations": {},
+                        "description_localizations": {}, "options": [], "dm_permission": True,
+                        "nsfw": False}
+    OPTION_DEFAULTS = {"name_localizations": {}, "description_localizations": {},
+                       "required": False, "choices": [], "options": [], "channel_types": [],
+                       "autocomplete": False}
+    # Oldest message age in seconds bulk deletes accept (14 days), minus a minute of leeway
+    BULK_DELETE_MAX_AGE = 14 * 24 * 60 * 60 - 60
     __CLIENT = None
+    __FLIGHTS = SingleFlight()
+    __CLIENT_LOCK = Lock()
     __LOGGER = getLogger("exdc.REST")
 
-    def __init__(self, authorization: str | None = None, user_agent: str | None = None):
-        if REST.__CLIENT is None:
-            REST.__CLIENT = Client(http2=h2_available)
-            REST.__CLIENT.base_url = f"{REST.API_URL}/v{REST.VERSION}/"
-            REST.__CLIENT.follow_redirects = True
-
+    def __init__(self, authorization: str | None = None, user_agent: str | None = None,
+                 rate_limiter: RateLimiter | None = None, max_retries: int = 3,
+                 client: Client | None = None, response_cache: ResponseCache | None = None,
+                 coalesce: bool = True, priority: Priority = Priority.USER,
+                 retry_policy: RetryPolicy | None = None):
         self.__authorization = authorization
+        self.__coalesce = coalesce
+        # Own client (e.g. from `create_client`) or the pool shared by all clients
+        self.__client = client or REST._shared_client()
+        self.__max_retries = max_retries
+        # Default priority of requests, e.g. `Priority.BACKGROUND` for bulk jobs
+        self.__priority = priority
+        self.__rate_limiter = rate_limiter or RateLimiter.for_authorization(authorization)
+        self.__retry_policy = retry_policy or RetryPolicy()
+        # Responses depend on authorization, so caches are per instance and opt-in
+        self.__response_cache = response_cache
         self.__user_agent = user_agent or __user_agent__
 
-    def _request(self, method: str, url: str, **kwargs):
-        if "headers" in kwargs:
-            kwargs["headers"] |= {"User-Agent": self.__user_agent}
+    @staticmethod
+    def _canonical_command(command: ApplicationCommand, guild: bool = False):
+        """Client set fields of command without defaults, equal for equivalent definitions"""
+        canonical = {}
 
-        else:
-            kwargs["headers"] = {"User-Agent": self.__user_agent}
+        for field in REST.COMMAND_FIELDS:
+            value = command.get(field)
+
+            if value is None or value == REST.COMMAND_DEFAULTS.get(field) or \
+                    guild and field == "dm_permission":
+                continue
+
+            if field == "options":
+                value = [REST._canonical_option(option) for option in value]
+
+            canonical[field] = value
+
+        return canonical
+
+    @staticmethod
+    def _canonical_option(option: ApplicationCommandOption):
+        canonical = {}
+
+        for field, value in option.items():
+            if value is None or value == REST.OPTION_DEFAULTS.get(field):
+                continue
+
+            if field == "options":
+                value = [REST._canonical_option(sub_option) for sub_option in value]
+
+            elif field == "choices":
+                value = [{key: item for key, item in choice.items() if item is not None}
+                         for choice in value]
+
+            elif field == "channel_types":
+                value = sorted(value)
+
+            canonical[field] = value
+
+        return canonical
+
+    @staticmethod
+    def _command_changes(application_id: str, guild_id: str | None,
+                         commands: list[ApplicationCommand], remote: list[ApplicationCommand]):
+        """Requests needed to turn remote commands into local ones, `(method, url, json)`
+
+        A single change is applied with its own request, anything more with one bulk overwrite.
+        Changed commands are recreated by POST, which replaces a command of the same name and type
+        as a whole, so fields left at their defaults locally are reset remotely (a PATCH would keep
+        them).
+        """
+        url = f"applications/{application_id}/" + \
+            (f"guilds/{guild_id}/commands" if guild_id is not None else "commands")
+        guild = guild_id is not None
+        local = {}
+
+        for command in commands:
+            canonical = REST._canonical_command(command, guild=guild)
+            local[(canonical.get("type", ApplicationCommandType.CHAT_INPUT),
+                   canonical["name"])] = canonical
+
+        remote_ids = {}
+        changes: list[tuple[str, str, Any]] = []
+
+        for command in remote:
+            canonical = REST._canonical_command(command, guild=guild)
+            key = (canonical.get("type", ApplicationCommandType.CHAT_INPUT), canonical["name"])
+            remote_ids[key] = command["id"]
+
+            if key not in local:
+                changes.append(("DELETE", f"{url}/{command['id']}", None))
+
+            elif local[key] != canonical:
+                changes.append(("POST", url, local[key]))
+
+        for key, canonical in local.items():
+            if key not in remote_ids:
+                changes.append(("POST", url, canonical))
+
+        if len(changes) > 1:
+            return [("PUT", url, list(local.values()))]
+
+        return changes
+
+    @staticmethod
+    def _delete_batches(message_ids: Iterable[int | str]):
+        """Group message IDs into bulk deletes of up to 100 IDs, IDs too old for bulk deletes (or
+        left without another ID to batch with) are yielded alone"""
+        batch: dict[str, None] = {}
+
+        for message_id in map(str, message_ids):
+            if int(message_id) < from_timestamp(time() - REST.BULK_DELETE_MAX_AGE):
+                yield [message_id]
+                continue
+
+            batch[message_id] = None
+
+            if len(batch) == 100:
+                yield list(batch)
+                batch.clear()
+
+        if batch:
+            yield list(batch)
+
+    @staticmethod
+    def _delete_request(channel_id: str, message_ids: list[str]):
+        """Method, url and json of request deleting message IDs of a batch"""
+        if len(message_ids) == 1:
+            return "DELETE", f"channels/{channel_id}/messages/{message_ids[0]}", None
+
+        return "POST", f"channels/{channel_id}/messages/bulk-delete", {"messages": message_ids}
+
+    def _headers(self, headers: dict[str, str] | None = None):
+        headers = (headers or {}) | {"User-Agent": self.__user_agent}
 
         if self.__authorization:
-            if "headers" in kwargs:
-                kwargs["headers"] |= {"Authorization": self.__authorization}
+            headers |= {"Authorization": self.__authorization}
+
+        return headers
+
+    @staticmethod
+    def _message_body(payload: dict[str, Any], uploads: list[UploadLike] | None,
+                      max_upload_size: int = Upload.MAX_SIZE):
+        """Request content and headers of message payload, a streamed multipart form if there are
+        uploads. Content is reusable for any number of requests."""
+        if not uploads:
+            return dumps(payload, separators=(",", ":")).encode("utf8"), \
+                {"Content-Type": "application/json"}
+
+        body = Multipart(payload, [(upload.attachment_id or REST.random_attachment_id(), upload)
+                                   for upload in map(Upload.of, uploads)], max_upload_size)
+        return body, {"Content-Type": body.content_type, "Content-Length": str(len(body))}
+
+    @staticmethod
+    def _message_payload(content: str | None = None, username: str | None = None,
+                         avatar_url: str | None = None, tts: bool | None = None,
+                         embeds: list[Embed] | None = None,
+                         allowed_mentions: AllowedMentions | None = None,
+                         message_reference: MessageReference | None = None,
+                         components: list[ActionRowComponent] | None = None,
+                         sticker_ids: list[str] | None = None, flags: MessageFlag | None = None,
+                         attachments: list[Attachment] | None = None,
+                         nonce: str | None = None, enforce_nonce: bool | None = None):
+        payload = {}
+
+        if embeds:
+            payload |= {"embeds": embeds}
+
+        if username:
+            payload |= {"username": username}
+
+        if avatar_url:
+            payload |= {"avatar_url": avatar_url}
+
+        if tts:
+            payload |= {"tts": tts}
 
-            else:
-                kwargs["headers"] = {"Authorization": self.__authorization}
+        if content:
+            payload |= {"content": content}
+
+        if sticker_ids:
+            payload |= {"sticker_ids": sticker_ids}
+
+        if allowed_mentions:
+            payload |= {"allowed_mentions": allowed_mentions}
+
+        if message_reference:
+            payload |= {"message_reference": message_reference}
+
+        if components:
+            payload |= {"components": components}
+
+        if flags:
+            payload |= {"flags": flags}
+
+        if attachments:
+            payload |= {"attachments": attachments}
+
+        if nonce:
+            payload |= {"nonce": nonce}
+
+        if enforce_nonce:
+            payload |= {"enforce_nonce": enforce_nonce}
+
+        return payload
+
+    def _page(self, url: str, params: dict[str, Any], forward: bool,
+              id_of: Callable[[Any], str], items_of: Callable[[Any], list[Any]] | None):
+        """Fetch page, items ordered in iteration direction"""
+        data = self._request("GET", url, params=params).json()
+        items = data if items_of is None else items_of(data)
+        return sorted(items, key=lambda item: int(id_of(item)), reverse=not forward)
+
+    def _paginate(self, url: str, page_size: int, forward: bool, id_of: Callable[[Any], str],
+                  cursor: int | str | datetime | None = None, limit: int | None = None,
+                  until: int | str | datetime | None = None, params: dict[str, Any] | None = None,
+                  items_of: Callable[[Any], list[Any]] | None = None):
+        """Yield items of paginated endpoint, fetching the next page while the current one is
+        consumed
+
+        Iterates by ascending IDs from `cursor` if `forward`, otherwise by descending IDs. Stops
+        after `limit` items or at the first item reaching `until` (snowflake or time).
+        """
+        cursor = REST._snowflake(cursor)
+        until = REST._snowflake(until)
+        cursor_param = "after" if forward else "before"
+        params = (params or {}) | {"limit": page_size}
+        count = 0
+
+        def reached(item_id: int):
+            return until is not None and (item_id >= until if forward else item_id <= until)
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="exdc-paginate") as pool:
+            page = self._page(url, params if cursor is None else params | {cursor_param: cursor},
+                              forward, id_of, items_of)
 
-        res = REST.__CLIENT.request(method, url, **kwargs)
+            while page:
+                last_id = int(id_of(page[-1]))
+
+                if len(page) == page_size and not reached(last_id) and \
+                        (limit is None or count + len(page) < limit):
+                    next_page = pool.submit(self._page, url, params | {cursor_param: last_id},
+                                            forward, id_of, items_of)
+
+                else:
+                    next_page = None
+
+                for item in page:
+                    if reached(int(id_of(item))):
+                        return
+
+                    yield item
+                    count += 1
+
+                    if limit is not None and count >= limit:
+                        return
+
+                page = next_page.result() if next_page is not None else []
+
+    @staticmethod
+    def _params(**params: Any):
+        """Query parameters which are set, None if none are"""
+        params = {key: value for key, value in params.items() if value is not None}
+        return params or None
+
+    def _request(self, method: str, url: str, priority: Priority | None = None,
+                 idempotent: bool | None = None, **kwargs):
+        kwargs["headers"] = self._headers(kwargs.get("headers"))
+        send = partial(REST._send, self.__client, self.__rate_limiter, self.__max_retries,
+                       self.__priority if priority is None else priority, method, url,
+                       retry_policy=self.__retry_policy, idempotent=idempotent, **kwargs)
+
+        if method != "GET":
+            res = send()
+
+            if self.__response_cache is not None:
+                self.__response_cache.invalidate(url)
+
+            return res
+
+        key = ResponseCache.key(url, kwargs.get("params"))
+
+        if self.__response_cache is not None:
+            res = self.__response_cache.get(key)
+
+            if res is not None:
+                return res
+
+        if self.__coalesce:
+            # Concurrent identical GETs share one request
+            res = REST.__FLIGHTS.do((self.__authorization, key), send)
+
+        else:
+            res = send()
+
+        if self.__response_cache is not None:
+            self.__response_cache.put(key, res)
+
+        return res
+
+    @staticmethod
+    def _send(client: Client, rate_limiter: RateLimiter, max_retries: int, priority: Priority,
+              method: str, url: str, retry_policy: RetryPolicy | None = None,
+              idempotent: bool | None = None, **kwargs):
+        """Send request once rate limits allow it (served by priority), retrying up to
+        `max_retries` times when rate limited and as `retry_policy` allows on transient failures"""
+        route = RateLimiter.route(method, url)
+        retries = 0
+        # Attempt number for `retry_policy`, retries after 429 are counted by `retries` instead
+        attempt = 1
+        ticket = object()
+
+        if idempotent is None:
+            idempotent = method in RetryPolicy.IDEMPOTENT_METHODS
+
+        while True:
+            try:
+                while (delay := rate_limiter.acquire(route, priority, ticket)) > 0:
+                    sleep(delay)
+
+            finally:
+                rate_limiter.release(ticket)
+
+            try:
+                res = client.request(method, url, **kwargs)
+
+            except TransportError as exc:
+                if retry_policy is None or not retry_policy.retry(attempt, idempotent, error=exc):
+                    raise
+
+                REST.__LOGGER.warning(f"{method} {url} failed ({exc!r}), retrying!")
+                sleep(retry_policy.backoff(attempt))
+                attempt += 1
+                continue
+
+            retry_after = rate_limiter.update(route, res)
+
+            if retry_after is None and retry_policy is not None:
+                if retry_policy.retry(attempt, idempotent, status_code=res.status_code):
+                    REST.__LOGGER.warning(f"{method} {url} failed with status code " +
+                                          f"{res.status_code}, retrying!")
+                    sleep(retry_policy.backoff(attempt))
+                    attempt += 1
+                    continue
+
+                if res.status_code < 400:
+                    retry_policy.succeeded()
+
+            if retry_after is None or retries >= max_retries:
+                break
+
+            retries += 1
+            sleep(retry_after)
 
         if res.status_code >= 400:
             raise RESTException(res)
 
         return res
 
+    @staticmethod
+    def _shared_client():
+        # Clients are safe to share between threads, only creating one has to be serialized
+        with REST.__CLIENT_LOCK:
+            if REST.__CLIENT is None:
+                REST.__CLIENT = REST.create_client()
+
+            return REST.__CLIENT
+
+    @staticmethod
+    def _snowflake(bound: int | str | datetime | None):
+        if isinstance(bound, datetime):
+            return from_datetime(bound)
+
+        return int(bound) if bound is not None else None
+
     def add_global_command(self, application_id: str, command: ApplicationCommand):
         return self._request("POST", f"applications/{application_id}/commands", json=command)
 
@@ -67,11 +438,53 @@ class REST:
         return self._request("POST", f"applications/{application_id}/guilds/{guild_id}/commands",
                              json=command)
 
+    @classmethod
+    def configure_pool(cls, limits: Limits | None = None, timeout: Timeout | float | None = 5.0,
+                       http2: bool = h2_available):
+        """Replace connection pool shared by clients created afterwards without their own client,
+        clients already using the previous pool keep it open"""
+        with REST.__CLIENT_LOCK:
+            REST.__CLIENT = cls.create_client(limits=limits, timeout=timeout, http2=http2)
+
+    @staticmethod
+    def create_client(limits: Limits | None = None, timeout: Timeout | float | None = 5.0,
+                      http2: bool = h2_available):
+        """HTTP client for Discord API, pass as `client` to give a `REST` instance its own
+        connection pool
+
+        `limits` sets pool size (`max_connections`, `max_keepalive_connections`) and
+        `keepalive_expiry`, `http2` multiplexes concurrent requests over each connection.
+        """
+        return Client(base_url=f"{REST.API_URL}/v{REST.VERSION}/", follow_redirects=True,
+                      http2=http2, limits=limits or Limits(), timeout=timeout)
+
+    @staticmethod
+    def commands_hash(commands: list[ApplicationCommand], guild: bool = False):
+        """Hash of command definitions, unchanged by field order or fields set to defaults"""
+        canonical = sorted((REST._canonical_command(command, guild=guild) for command in commands),
+                           key=lambda command: (command.get("type", 1), command["name"]))
+        return sha256(dumps(canonical, sort_keys=True, separators=(",", ":"))
+                      .encode("utf8")).hexdigest()
+
     def create_dm_channel(self, recipient_id: str):
         res = self._request("POST", "users/@me/channels", json={"recipient_id": recipient_id})
         channel: Channel = res.json()
         return channel
 
+    def bulk_delete_messages(self, channel_id: str, message_ids: list[str]):
+        """Delete 2 to 100 messages not older than 14 days"""
+        return self._request("POST", f"channels/{channel_id}/messages/bulk-delete",
+                             json={"messages": message_ids})
+
+    def bulk_overwrite_global_commands(self, application_id: str,
+                                       commands: list[ApplicationCommand]):
+        return self._request("PUT", f"applications/{application_id}/commands", json=commands)
+
+    def bulk_overwrite_guild_commands(self, application_id: str, guild_id: str,
+                                      commands: list[ApplicationCommand]):
+        return self._request("PUT", f"applications/{application_id}/guilds/{guild_id}/commands",
+                             json=commands)
+
     def delete_global_command(self, application_id: str, command_id: str):
         return self._request("DELETE", f"applications/{application_id}/commands/{command_id}")
 
@@ -79,6 +492,44 @@ class REST:
         return self._request("DELETE", f"applications/{application_id}/guilds/{guild_id}/" +
                              f"commands/{command_id}")
 
+    def delete_message(self, channel_id: str, message_id: str):
+        return self._request("DELETE", f"channels/{channel_id}/messages/{message_id}")
+
+    def delete_messages(self, channel_id: str, message_ids: Iterable[int | str],
+                        priority: Priority = Priority.BACKGROUND, max_workers: int = 4):
+        """Delete messages of channel concurrently, as bulk deletes of up to 100 messages where
+        they are recent enough and one by one otherwise
+
+        IDs are consumed lazily, so `message_ids` can be a paginator. Yields `(message IDs,
+        response or exception)` per request as requests complete, pending requests are cancelled
+        if the generator is closed early.
+        """
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exdc-delete")
+        futures: dict[Future, list[str]] = {}
+
+        def completed():
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                exc = future.exception()
+                yield futures.pop(future), exc if exc is not None else future.result()
+
+        try:
+            for batch in REST._delete_batches(message_ids):
+                method, url, json = REST._delete_request(channel_id, batch)
+                futures[pool.submit(self._request, method, url, priority=priority,
+                                    json=json)] = batch
+
+                # Bound requests queued ahead of the rate limit
+                while len(futures) >= 2 * max_workers:
+                    yield from completed()
+
+            while futures:
+                yield from completed()
+
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
     def get_gateway(self):
         res = self._request("GET", "gateway")
         data: GetGatewayResponse = res.json()
@@ -88,13 +539,8 @@ class REST:
         return self._request("GET", f"applications/{application_id}/commands/{command_id}")
 
     def get_global_commands(self, application_id: str, with_localizations: bool | None = None):
-        if with_localizations is not None:
-            params = {"with_localizations": with_localizations}
-
-        else:
-            params = None
-
-        res = self._request("GET", f"applications/{application_id}/commands", params=params)
+        res = self._request("GET", f"applications/{application_id}/commands",
+                            params=REST._params(with_localizations=with_localizations))
 
         return res
 
@@ -106,24 +552,67 @@ class REST:
 
     def get_guild_commands(self, application_id: str, guild_id: str,
                            with_localizations: bool | None = None):
-        if with_localizations is not None:
-            params = {"with_localizations": with_localizations}
-
-        else:
-            params = None
-
         res = self._request("GET", f"applications/{application_id}/guilds/{guild_id}/commands",
-                            params=params)
+                            params=REST._params(with_localizations=with_localizations))
 
         return res
 
     def interaction_response(self, interaction: Interaction, callback: InteractionResponse):
         res = self._request("POST",
                             f"interactions/{interaction['id']}/{interaction['token']}/callback",
-                            json=callback)
+                            json=callback, priority=Priority.INTERACTION)
 
         return res
 
+    def iter_audit_log_entries(self, guild_id: str, before: int | str | datetime | None = None,
+                               until: int | str | datetime | None = None,
+                               limit: int | None = None, user_id: str | None = None,
+                               action_type: int | None = None):
+        """Audit log entries of guild from newest (or `before`) to oldest, down to `until`"""
+        return self._paginate(f"guilds/{guild_id}/audit-logs", 100, False,
+                              lambda entry: entry["id"], cursor=before, limit=limit, until=until,
+                              params=REST._params(user_id=user_id, action_type=action_type),
+                              items_of=lambda data: data["audit_log_entries"])
+
+    def iter_guild_bans(self, guild_id: str, after: int | str | datetime | None = None,
+                        until: int | str | datetime | None = None, limit: int | None = None):
+        """Bans of guild by ascending user ID"""
+        bans: Iterable[Ban] = self._paginate(f"guilds/{guild_id}/bans", 1000, True,
+                                             lambda ban: ban["user"]["id"], cursor=after or 0,
+                                             limit=limit, until=until)
+        return bans
+
+    def iter_guild_members(self, guild_id: str, after: int | str | datetime | None = None,
+                           until: int | str | datetime | None = None, limit: int | None = None):
+        """Members of guild by ascending user ID"""
+        members: Iterable[GuildMember] = self._paginate(f"guilds/{guild_id}/members", 1000, True,
+                                                        lambda member: member["user"]["id"],
+                                                        cursor=after or 0, limit=limit,
+                                                        until=until)
+        return members
+
+    def iter_messages(self, channel_id: str, before: int | str | datetime | None = None,
+                      after: int | str | datetime | None = None,
+                      until: int | str | datetime | None = None, limit: int | None = None):
+        """Messages of channel from newest (or `before`) to oldest, or from `after` to newest if
+        only `after` is set, stopping at `until`"""
+        forward = after is not None and before is None
+        messages: Iterable[Message] = self._paginate(f"channels/{channel_id}/messages", 100,
+                                                     forward, lambda message: message["id"],
+                                                     cursor=after if forward else before,
+                                                     limit=limit, until=until)
+        return messages
+
+    def iter_reactions(self, channel_id: str, message_id: str, emoji: str,
+                       after: int | str | datetime | None = None,
+                       until: int | str | datetime | None = None, limit: int | None = None):
+        """Users who reacted with emoji (unicode or `name:id`) by ascending user ID"""
+        users: Iterable[User] = self._paginate(f"channels/{channel_id}/messages/{message_id}/" +
+                                               f"reactions/{quote(emoji)}", 100, True,
+                                               lambda user: user["id"], cursor=after or 0,
+                                               limit=limit, until=until)
+        return users
+
     def post_message(self, channel_id: str, content: str | None = None, tts: bool | None = None,
                      embeds: list[Embed] | None = None,
                      allowed_mentions: AllowedMentions | None = None,
@@ -131,60 +620,25 @@ class REST:
                      components: list[ActionRowComponent] | None = None,
                      sticker_ids: list[str] | None = None, flags: MessageFlag | None = None,
                      attachments: list[Attachment] | None = None,
-                     uploads: list[tuple[IO[bytes], str, str | None]] | None = None):
+                     uploads: list[UploadLike] | None = None,
+                     nonce: str | None = None, max_upload_size: int = Upload.MAX_SIZE):
+        """Create message in channel
+
+        Message is created with an enforced `nonce` (random unless set), so retrying it can't
+        create a duplicate message. Uploads larger than `max_upload_size` in total fail with
+        ValueError before sending, raise it for boosted guilds.
+        """
         assert content or embeds or sticker_ids or components or uploads
 
-        payload = {}
-
-        if embeds:
-            payload |= {"embeds": embeds}
-
-        if tts:
-            payload |= {"tts": tts}
-
-        if content:
-            payload |= {"content": content}
-
-        if sticker_ids:
-            payload |= {"sticker_ids": sticker_ids}
-
-        if allowed_mentions:
-            payload |= {"allowed_mentions": allowed_mentions}
-
-        if message_reference:
-            payload |= {"message_reference": message_reference}
-
-        if components:
-            payload |= {"components": components}
-
-        if flags:
-            payload |= {"flags": flags}
-
-        if attachments:
-            payload |= {"attachments": attachments}
-
-        if uploads:
-            files = {
-                "payload_json": (None, dumps(payload, separators=(",", ":")), "application/json"),
-            }
-
-            for stream, filename, attachment_id in uploads:
-                attachment_id = attachment_id or REST.random_attachment_id()
-                mimetype = guess_type(filename, strict=False)[0]
-                assert mimetype is not None and mimetype.startswith(("image/", "video/"))
-
-                files |= {
-                    f"files[{attachment_id}]": (f"{attachment_id}{Path(filename).suffix}",
-                                                stream, mimetype),
-                }
-
-            json = None
-
-        else:
-            files = None
-            json = payload
-
-        res = self._request("POST", f"channels/{channel_id}/messages", files=files, json=json)
+        payload = REST._message_payload(content=content, tts=tts, embeds=embeds,
+                                        allowed_mentions=allowed_mentions,
+                                        message_reference=message_reference,
+                                        components=components, sticker_ids=sticker_ids,
+                                        flags=flags, attachments=attachments,
+                                        nonce=nonce or REST.random_nonce(), enforce_nonce=True)
+        content, headers = REST._message_body(payload, uploads, max_upload_size)
+        res = self._request("POST", f"channels/{channel_id}/messages", idempotent=True,
+                            content=content, headers=headers)
 
         return res
 
@@ -196,91 +650,107 @@ class REST:
                              components: list[ActionRowComponent] | None = None,
                              flags: MessageFlag | None = None,
                              attachments: list[Attachment] | None = None,
-                             uploads: list[tuple[IO[bytes], str, str | None]] | None = None,
+                             uploads: list[UploadLike] | None = None,
                              wait: bool | None = None, thread_id: str | None = None,
-                             user_agent: str | None = None):
+                             user_agent: str | None = None, max_retries: int = 3,
+                             client: Client | None = None, priority: Priority = Priority.USER,
+                             max_upload_size: int = Upload.MAX_SIZE):
         assert content or embeds or components or uploads
 
-        if REST.__CLIENT is None:
-            REST.__CLIENT = Client(http2=h2_available)
-            REST.__CLIENT.base_url = f"{REST.API_URL}/v{REST.VERSION}/"
-            REST.__CLIENT.follow_redirects = True
-
-        payload = {}
-
-        if embeds:
-            payload |= {"embeds": embeds}
-
-        if username:
-            payload |= {"username": username}
-
-        if avatar_url:
-            payload |= {"avatar_url": avatar_url}
-
-        if tts:
-            payload |= {"tts": tts}
-
-        if content:
-            payload |= {"content": content}
+        payload = REST._message_payload(content=content, username=username,
+                                        avatar_url=avatar_url, tts=tts, embeds=embeds,
+                                        allowed_mentions=allowed_mentions, components=components,
+                                        flags=flags, attachments=attachments)
 
-        if allowed_mentions:
-            payload |= {"allowed_mentions": allowed_mentions}
+        content, headers = REST._message_body(payload, uploads, max_upload_size)
 
-        if components:
-            payload |= {"components": components}
+        # Webhook requests aren't authorized by a token, their limits are shared
+        res = REST._send(client or REST._shared_client(), RateLimiter.for_authorization(None),
+                         max_retries, priority, "POST", f"webhooks/{webhook_id}/{webhook_token}",
+                         params=REST._params(wait=wait, thread_id=thread_id),
+                         headers=headers | {"User-Agent": user_agent or __user_agent__},
+                         content=content)
 
-        if flags:
-            payload |= {"flags": flags}
-
-        if attachments:
-            payload |= {"attachments": attachments}
+        return res
 
-        if uploads:
-            files = {
-                "payload_json": (None, dumps(payload, separators=(",", ":")),
-                                 "application/json"),
-            }
+    @staticmethod
+    def post_webhook_messages(webhooks: Iterable[tuple[str, str]], content: str | None = None,
+                              username: str | None = None, avatar_url: str | None = None,
+                              tts: bool | None = None, embeds: list[Embed] | None = None,
+                              allowed_mentions: AllowedMentions | None = None,
+                              components: list[ActionRowComponent] | None = None,
+                              flags: MessageFlag | None = None,
+                              attachments: list[Attachment] | None = None,
+                              uploads: list[UploadLike] | None = None,
+                              wait: bool | None = None, user_agent: str | None = None,
+                              max_retries: int = 3, client: Client | None = None,
+                              priority: Priority = Priority.BACKGROUND, max_workers: int = 16,
+                              retry_policy: RetryPolicy | None = None,
+                              max_upload_size: int = Upload.MAX_SIZE):
+        """Post the same message to every `(webhook ID, webhook token)` pair concurrently
+
+        Payload is encoded once and uploads are streamed from their source for each request, each
+        webhook is rate limited on its own bucket. Yields `(webhook ID, response or exception)`
+        as requests complete, pending requests are cancelled if the generator is closed early.
+        """
+        assert content or embeds or components or uploads
 
-            for stream, filename, attachment_id in uploads:
-                attachment_id = attachment_id or REST.random_attachment_id()
-                mimetype = guess_type(filename, strict=False)[0]
-                assert mimetype is not None and mimetype.startswith(("image/", "video/"))
+        payload = REST._message_payload(content=content, username=username,
+                                        avatar_url=avatar_url, tts=tts, embeds=embeds,
+                                        allowed_mentions=allowed_mentions, components=components,
+                                        flags=flags, attachments=attachments)
+        body, headers = REST._message_body(payload, uploads, max_upload_size)
+        headers |= {"User-Agent": user_agent or __user_agent__}
+        send = partial(REST._send, client or REST._shared_client(),
+                       RateLimiter.for_authorization(None), max_retries, priority,
+                       retry_policy=retry_policy or RetryPolicy(), content=body, headers=headers,
+                       params=REST._params(wait=wait))
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exdc-webhook")
+
+        try:
+            futures = {pool.submit(send, "POST", f"webhooks/{webhook_id}/{webhook_token}"):
+                       webhook_id for webhook_id, webhook_token in webhooks}
+
+            for future in as_completed(futures):
+                exc = future.exception()
+                yield futures[future], exc if exc is not None else future.result()
+
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
 
-                files |= {
-                    f"files[{attachment_id}]": (f"{attachment_id}{Path(filename).suffix}",
-                                                stream, mimetype),
-                }
+    @staticmethod
+    def random_attachment_id():
+        return str(randint(0, 0x7fffffffffffffff))
 
-            json = None
+    @staticmethod
+    def random_nonce():
+        return str(randint(0, 0x7fffffffffffffff))
 
-        else:
-            files = None
-            json = payload
+    def sync_commands(self, application_id: str, commands: list[ApplicationCommand],
+                      guild_id: str | None = None, known_hash: str | None = None):
+        """Make registered global (or guild if `guild_id` set) commands match `commands`
 
-        if wait is not None or thread_id is not None:
-            params = {}
+        No request is sent if `known_hash` (returned by a previous sync) matches the definitions,
+        otherwise remote commands are fetched and only the difference is applied, as one bulk
+        overwrite if more than one command changed. Returns hash of definitions to store.
+        """
+        commands_hash = REST.commands_hash(commands, guild=guild_id is not None)
 
-            if wait is not None:
-                params |= {"wait": wait}
+        if commands_hash == known_hash:
+            return commands_hash
 
-            if thread_id is not None:
-                params |= {"thread_id": thread_id}
+        if guild_id is not None:
+            res = self.get_guild_commands(application_id, guild_id, with_localizations=True)
 
         else:
-            params = None
+            res = self.get_global_commands(application_id, with_localizations=True)
 
-        res = REST.__CLIENT.post(f"webhooks/{webhook_id}/{webhook_token}", files=files, json=json,
-                                 params=params,
-                                 headers={"User-Agent": user_agent or __user_agent__})
+        for method, url, json in REST._command_changes(application_id, guild_id, commands,
+                                                       res.json()):
+            REST.__LOGGER.info(f"Syncing commands: {method} {url}")
+            self._request(method, url, json=json, priority=Priority.BACKGROUND)
 
-        if res.status_code >= 400:
-            raise RESTException(res)
-
-        return res
-
-    @staticmethod
-    def random_attachment_id():
-        return str(randint(0, 0x7fffffffffffffff))
+        return commands_hash
 
     def update_global_command(self, application_id: str, command_id: str,
                               command: ApplicationCommand):
@@ -297,5 +767,30 @@ class REST:
         return res
 
     @classmethod
-    def with_bot_token(cls, token: str, user_agent: str | None = None):
-        return cls(f"Bot {token}", user_agent=user_agent)
+    def with_bot_token(cls, token: str, user_agent: str | None = None, **kwargs):
+        """Client authorized with bot token, remaining arguments are passed to the constructor"""
+        return cls(f"Bot {token}", user_agent=user_agent, **kwargs)
+
+    @property
+    def client(self):
+        return self.__client
+
+    @property
+    def coalesce(self):
+        return self.__coalesce
+
+    @property
+    def priority(self):
+        return self.__priority
+
+    @property
+    def rate_limiter(self):
+        return self.__rate_limiter
+
+    @property
+    def retry_policy(self):
+        return self.__retry_policy
+
+    @property
+    def response_cache(self):
+        return self.__response_cache
@@ -0,0 +1,72 @@
+from __future__ import annotations
+from random import uniform
+from threading import Lock
+
+from httpx import ConnectError, ConnectTimeout, PoolTimeout, TransportError
+
+
+class RetryPolicy:
+    """Retries of REST requests failing transiently (5xx responses, connection errors)
+
+    Delays back off exponentially with full jitter. Retries are paid from a budget refilled by
+    `budget_ratio` for every successful request (capped at `max_budget`), so an outage can't
+    multiply traffic by more than that ratio. Requests which aren't idempotent are only retried
+    if they failed before reaching Discord.
+    """
+
+    IDEMPOTENT_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "PUT")
+    RETRY_STATUSES = (500, 502, 503, 504)
+    # Errors raised before the request was sent, safe to retry any request after
+    UNSENT_ERRORS = (ConnectError, ConnectTimeout, PoolTimeout)
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 10.0,
+                 budget_ratio: float = 0.1, max_budget: float = 10.0):
+        self.__base_delay = base_delay
+        self.__budget = max_budget
+        self.__budget_ratio = budget_ratio
+        self.__lock = Lock()
+        self.__max_attempts = max_attempts
+        self.__max_budget = max_budget
+        self.__max_delay = max_delay
+        self.__retries = 0
+
+    def backoff(self, attempt: int):
+        """Seconds to wait before retry `attempt` (starting at 1)"""
+        return uniform(0, min(self.__max_delay, self.__base_delay * 2 ** (attempt - 1)))
+
+    def retry(self, attempt: int, idempotent: bool, status_code: int | None = None,
+              error: Exception | None = None):
+        """Whether failed `attempt` (starting at 1) should be retried, withdraws from budget if
+        so"""
+        if attempt >= self.__max_attempts:
+            return False
+
+        if error is not None:
+            if not isinstance(error, TransportError) or \
+                    not idempotent and not isinstance(error, RetryPolicy.UNSENT_ERRORS):
+                return False
+
+        elif status_code not in RetryPolicy.RETRY_STATUSES or not idempotent:
+            return False
+
+        with self.__lock:
+            if self.__budget < 1:
+                return False
+
+            self.__budget -= 1
+            self.__retries += 1
+            return True
+
+    def succeeded(self):
+        """Refill budget after a successful request"""
+        with self.__lock:
+            self.__budget = min(self.__max_budget, self.__budget + self.__budget_ratio)
+
+    @property
+    def budget(self):
+        return self.__budget
+
+    @property
+    def retries(self):
+        """Number of retries made"""
+        return self.__retries
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import getLogger
+from threading import Condition, Thread
+from time import monotonic
+from typing import Any
+
+from httpx import Response
+
+from ._rest import REST
+from ..type.channel import Embed
+
+
+class _Channel:
+    __slots__ = ("busy", "first_at", "pending")
+
+    def __init__(self):
+        self.busy = False
+        self.first_at = 0.0
+        self.pending: deque[tuple[dict[str, Any], Future[Response]]] = deque()
+
+
+class SendQueue:
+    """Ordered outbound message queue per channel, coalescing small messages
+
+    Messages are held for up to `window` seconds, then sent in order. Adjacent messages with only
+    `content` are joined by newlines up to `max_content` characters and adjacent messages with
+    only `embeds` are grouped up to `max_embeds` embeds and `max_embed_text` characters of embed
+    text, any other message is sent as is. A channel has one request in flight at a time, so
+    while its rate limit holds requests back more messages are merged into the next one. Channels
+    are sent concurrently.
+    """
+
+    __LOGGER = getLogger("exdc.SendQueue")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_args):
+        self.close()
+
+    def __init__(self, rest: REST, window: float = 0.5, max_content: int = 2000,
+                 max_embeds: int = 10, max_workers: int = 8, max_embed_text: int = 6000):
+        self.__channels: dict[str, _Channel] = {}
+        self.__closed = False
+        self.__condition = Condition()
+        self.__max_content = max_content
+        self.__max_embed_text = max_embed_text
+        self.__max_embeds = max_embeds
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exdc-send")
+        self.__rest = rest
+        self.__window = window
+        self.__dispatcher = Thread(target=self._dispatch, name="exdc-send-queue", daemon=True)
+        self.__dispatcher.start()
+
+    def _batch(self, pending: deque[tuple[dict[str, Any], Future[Response]]]):
+        """Pop the next message to send from pending, merged with the following ones if
+        possible"""
+        message, future = pending.popleft()
+        futures = [future]
+
+        if message.keys() == {"content"}:
+            content = message["content"]
+
+            while pending and pending[0][0].keys() == {"content"} and \
+                    len(content) + 1 + len(pending[0][0]["content"]) <= self.__max_content:
+                next_message, future = pending.popleft()
+                content = f"{content}\n{next_message['content']}"
+                futures.append(future)
+
+            message = {"content": content}
+
+        elif message.keys() == {"embeds"}:
+            embeds = list(message["embeds"])
+            text = SendQueue._embed_text(embeds)
+
+            while pending and pending[0][0].keys() == {"embeds"} and \
+                    len(embeds) + len(pending[0][0]["embeds"]) <= self.__max_embeds:
+                next_text = SendQueue._embed_text(pending[0][0]["embeds"])
+
+                if text + next_text > self.__max_embed_text:
+                    break
+
+                next_message, future = pending.popleft()
+                embeds.extend(next_message["embeds"])
+                futures.append(future)
+                text += next_text
+
+            message = {"embeds": embeds}
+
+        return message, futures
+
+    def _dispatch(self):
+        with self.__condition:
+            while True:
+                now = monotonic()
+                deadline = None
+
+                for channel_id, channel in self.__channels.items():
+                    if channel.busy or not channel.pending:
+                        continue
+
+                    due_at = channel.first_at + self.__window
+
+                    if due_at <= now or self.__closed:
+                        channel.busy = True
+                        message, futures = self._batch(channel.pending)
+                        channel.first_at = now
+                        self.__pool.submit(self._send, channel_id, channel, message, futures)
+
+                    elif deadline is None or due_at < deadline:
+                        deadline = due_at
+
+                # Forget idle channels
+                for channel_id in [channel_id for channel_id, channel in self.__channels.items()
+                                   if not channel.busy and not channel.pending]:
+                    del self.__channels[channel_id]
+
+                if self.__closed and not self.__channels:
+                    return
+
+                self.__condition.wait(None if deadline is None else deadline - now)
+
+    @staticmethod
+    def _embed_text(embeds: list[Embed]):
+        """Characters counted towards Discord's limit of embed text per message"""
+        length = 0
+
+        for embed in embeds:
+            length += len(embed.get("title") or "") + len(embed.get("description") or "")
+            length += len((embed.get("footer") or {}).get("text") or "")
+            length += len((embed.get("author") or {}).get("name") or "")
+
+            for field in embed.get("fields") or ():
+                length += len(field.get("name") or "") + len(field.get("value") or "")
+
+        return length
+
+    def _send(self, channel_id: str, channel: _Channel, message: dict[str, Any],
+              futures: list[Future[Response]]):
+        try:
+            res = self.__rest.post_message(channel_id, **message)
+
+        except Exception as exc:
+            SendQueue.__LOGGER.warning(f"Sending queued message to {channel_id} failed: {exc!r}")
+
+            for future in futures:
+                future.set_exception(exc)
+
+        else:
+            for future in futures:
+                future.set_result(res)
+
+        with self.__condition:
+            channel.busy = False
+            self.__condition.notify()
+
+    def close(self):
+        """Send all queued messages and stop, blocks until they were sent"""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+
+        self.__dispatcher.join()
+        self.__pool.shutdown()
+
+    def send(self, channel_id: str, **message: Any):
+        """Queue message (`REST.post_message` arguments) for channel, returns future of the
+        response of the (possibly merged) message it was sent with"""
+        future: Future[Response] = Future()
+
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("Send queue is closed!")
+
+            channel = self.__channels.setdefault(channel_id, _Channel())
+
+            if not channel.pending:
+                channel.first_at = monotonic()
+
+            channel.pending.append((message, future))
+            self.__condition.notify()
+
+        return future
@@ -0,0 +1,207 @@
+from __future__ import annotations
+from asyncio import to_thread
+from io import SEEK_END
+from json import dumps
+from mimetypes import guess_type
+from mmap import mmap
+from os import PathLike
+from pathlib import Path
+from secrets import token_hex
+from threading import Lock
+from typing import Any, IO, Iterable
+
+
+class Upload:
+    """File prepared for uploading as message attachment, reusable for any number of messages
+
+    Source is a path, a bytes-like buffer (bytes, bytearray, memoryview, mmap) or a binary stream
+    read from its current position. Size and mimetype are determined once, content is read in
+    chunks of `CHUNK_SIZE` bytes each time it's sent, so files aren't loaded into memory.
+    Sources must not change while the upload is in use. Streams which can't seek are read into
+    memory.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    # Default upload size limit of Discord per message, boosted guilds allow larger uploads
+    MAX_SIZE = 10 * 1024 * 1024
+
+    def __init__(self,
+                 source: str | PathLike | bytes | bytearray | memoryview | mmap | IO[bytes],
+                 filename: str | None = None, attachment_id: str | None = None,
+                 mimetype: str | None = None):
+        self.__attachment_id = attachment_id
+        self.__lock = Lock()
+        self.__offset = 0
+        self.__path = None
+        self.__stream = None
+        self.__view = None
+
+        if isinstance(source, (str, PathLike)):
+            self.__path = Path(source)
+            self.__size = self.__path.stat().st_size
+            filename = filename or self.__path.name
+
+        elif isinstance(source, (bytes, bytearray, memoryview, mmap)):
+            self.__view = memoryview(source).cast("B")
+            self.__size = self.__view.nbytes
+
+        elif source.seekable():
+            self.__stream = source
+            self.__offset = source.tell()
+            self.__size = source.seek(0, SEEK_END) - self.__offset
+            source.seek(self.__offset)
+
+        else:
+            self.__view = memoryview(source.read())
+            self.__size = self.__view.nbytes
+
+        assert filename, "Filename is required for uploads not from a path!"
+
+        self.__filename = filename
+        self.__mimetype = mimetype or guess_type(filename, strict=False)[0] or \
+            "application/octet-stream"
+
+    def __iter__(self):
+        """Content in chunks"""
+        if self.__path is not None:
+            with self.__path.open("rb") as file:
+                while chunk := file.read(Upload.CHUNK_SIZE):
+                    yield chunk
+
+        elif self.__stream is not None:
+            position = self.__offset
+            end = self.__offset + self.__size
+
+            while position < end:
+                # Stream may be shared by concurrent requests, each chunk is read at its position
+                with self.__lock:
+                    self.__stream.seek(position)
+                    chunk = self.__stream.read(min(Upload.CHUNK_SIZE, end - position))
+
+                if not chunk:
+                    break
+
+                position += len(chunk)
+                yield chunk
+
+        else:
+            for start in range(0, self.__size, Upload.CHUNK_SIZE):
+                yield bytes(self.__view[start:start + Upload.CHUNK_SIZE])
+
+    @staticmethod
+    def of(upload: UploadLike):
+        """Upload of `(stream, filename, attachment ID)` tuple, uploads are returned as is"""
+        if isinstance(upload, Upload):
+            return upload
+
+        stream, filename, attachment_id = upload
+        return Upload(stream, filename, attachment_id)
+
+    @property
+    def attachment_id(self):
+        """Attachment ID to reference upload by in message payload, random per message if None"""
+        return self.__attachment_id
+
+    @property
+    def filename(self):
+        return self.__filename
+
+    @property
+    def mimetype(self):
+        return self.__mimetype
+
+    @property
+    def size(self):
+        return self.__size
+
+
+UploadLike = Upload | tuple[IO[bytes], str, str | None]
+
+
+class _AsyncChunks:
+    """Async iterable of chunks, reading them in a worker thread so file reads don't block the
+    event loop"""
+
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        chunks = iter(self.chunks)
+
+        while (chunk := await to_thread(next, chunks, None)) is not None:
+            yield chunk
+
+
+class Multipart:
+    """Multipart form body of message payload and uploads
+
+    Part headers are encoded once and upload content is streamed, the body can be iterated any
+    number of times (retries, sending to multiple channels). Fails with ValueError before
+    anything is sent if an upload or all uploads together are larger than `max_size`.
+    """
+
+    def __init__(self, payload: dict[str, Any], uploads: list[tuple[str, Upload]],
+                 max_size: int = Upload.MAX_SIZE):
+        boundary = token_hex(16)
+        self.__content_type = f"multipart/form-data; boundary={boundary}"
+        self.__parts: list[tuple[bytes, Upload | bytes]] = [
+            (Multipart._header(boundary, "payload_json", None, "application/json"),
+             dumps(payload, separators=(",", ":")).encode("utf8")),
+        ]
+
+        for attachment_id, upload in uploads:
+            if upload.size > max_size:
+                raise ValueError(f"Upload {upload.filename} is {upload.size} bytes, larger " +
+                                 f"than the limit of {max_size} bytes!")
+
+            filename = f"{attachment_id}{Path(upload.filename).suffix}"
+            self.__parts.append((Multipart._header(boundary, f"files[{attachment_id}]", filename,
+                                                   upload.mimetype), upload))
+
+        size = sum(upload.size for _, upload in uploads)
+
+        if size > max_size:
+            raise ValueError(f"Uploads are {size} bytes in total, larger than the limit of " +
+                             f"{max_size} bytes!")
+
+        self.__end = f"--{boundary}--\r\n".encode("utf8")
+        self.__length = sum(len(header) + (len(data) if isinstance(data, bytes) else data.size) + 2
+                            for header, data in self.__parts) + len(self.__end)
+
+    def __iter__(self):
+        for header, data in self.__parts:
+            yield header
+
+            if isinstance(data, bytes):
+                yield data
+
+            else:
+                yield from data
+
+            yield b"\r\n"
+
+        yield self.__end
+
+    def __len__(self):
+        return self.__length
+
+    @staticmethod
+    def _header(boundary: str, name: str, filename: str | None, mimetype: str):
+        disposition = f"form-data; name=\"{name}\""
+
+        if filename is not None:
+            disposition += f"; filename=\"{filename}\""
+
+        header = f"--{boundary}\r\nContent-Disposition: {disposition}\r\n" + \
+            f"Content-Type: {mimetype}\r\n\r\n"
+        return header.encode("utf8")
+
+    def async_chunks(self):
+        """Body as async iterable, for async clients"""
+        return _AsyncChunks(self)
+
+    @property
+    def content_type(self):
+        return self.__content_type
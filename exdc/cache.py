@@ -0,0 +1,9 @@
+from ._cache._index import StateIndex  # noqa: F401
+from ._cache._member import MemberColumns, MemberStore  # noqa: F401
+from ._cache._message import MessageCache  # noqa: F401
+from ._cache._permission import PermissionCache  # noqa: F401
+from ._cache._presence import Presence, PresenceCache  # noqa: F401
+from ._cache._record import ChannelRecord, GuildMemberRecord, GuildRecord, OverwriteRecord, \
+    RecordDiff, RoleRecord, UserRecord  # noqa: F401
+from ._cache._state import State  # noqa: F401
+from ._cache._voice import VoiceStates  # noqa: F401
@@ -1,2 +1,9 @@
+from ._client._async_rest import AsyncREST  # noqa: F401
 from ._client._rest import REST  # noqa: F401
 from ._client._gateway import Gateway  # noqa: F401
+from ._client._intern import Interner  # noqa: F401
+from ._client._ratelimit import Priority, RateLimiter  # noqa: F401
+from ._client._response_cache import ResponseCache  # noqa: F401
+from ._client._retry import RetryPolicy  # noqa: F401
+from ._client._send_queue import SendQueue  # noqa: F401
+from ._client._upload import Upload  # noqa: F401
@@ -0,0 +1,79 @@
+from __future__ import annotations
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable
+
+DISCORD_EPOCH = 1420070400000
+
+
+class Snowflake(int):
+    """Discord snowflake ID stored as an int
+
+    Behaves like a regular int (hashing, ordering, arithmetic), with helpers to extract the
+    fields packed into the ID.
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return f"Snowflake({int(self)})"
+
+    def __str__(self):
+        return int.__repr__(self)
+
+    @classmethod
+    def from_datetime(cls, dt: datetime, high: bool = False):
+        """Create snowflake usable as pagination bound for `dt`.
+
+        By default the lowest snowflake for the millisecond is returned, pass `high=True` to get
+        the highest one instead (useful for inclusive upper bounds).
+        """
+        return cls(from_timestamp(dt.timestamp(), high=high))
+
+    @property
+    def created_at(self):
+        """Creation time of snowflake as timezone aware UTC datetime"""
+        return datetime.fromtimestamp(timestamp(self), tz=timezone.utc)
+
+    @property
+    def increment(self):
+        return self & 0xFFF
+
+    @property
+    def process_id(self):
+        return (self >> 12) & 0x1F
+
+    @property
+    def timestamp(self):
+        """Creation time of snowflake as UNIX timestamp in seconds"""
+        return timestamp(self)
+
+    @property
+    def worker_id(self):
+        return (self >> 17) & 0x1F
+
+
+def from_datetime(dt: datetime, high: bool = False):
+    """Lowest (or highest if `high`) snowflake int for the millisecond of `dt`."""
+    return from_timestamp(dt.timestamp(), high=high)
+
+
+def from_timestamp(ts: float, high: bool = False):
+    """Lowest (or highest if `high`) snowflake int for the millisecond of UNIX timestamp `ts`."""
+    snowflake = (int(ts * 1000) - DISCORD_EPOCH) << 22
+    return snowflake | 0x3FFFFF if high else snowflake
+
+
+def timestamp(snowflake: int | str):
+    """UNIX timestamp in seconds of when `snowflake` was created."""
+    return ((int(snowflake) >> 22) + DISCORD_EPOCH) / 1000
+
+
+def to_array(snowflakes: Iterable[int | str]):
+    """Convert IDs to unsigned 64-bit array, 8 bytes per ID instead of a str or int object."""
+    return array("Q", map(int, snowflakes))
+
+
+def to_strs(snowflakes: Iterable[int]):
+    """Convert int IDs back to their str form, as used in payloads."""
+    return list(map(str, snowflakes))
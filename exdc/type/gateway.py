@@ -54,6 +54,12 @@ class HelloPayload(ReceiveEventPayload):
     d: HelloData
 
 
+class GatewaySession(TypedDict):
+    session_id: str
+    resume_gateway_url: str
+    seq: int | None
+
+
 class GetGatewayResponse(TypedDict):
     url: str
 
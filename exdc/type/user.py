@@ -12,6 +12,11 @@ class ApplicationRoleConnection(TypedDict):
     metadata: ApplicationRoleConnectionMetadata
 
 
+class AvatarDecorationData(TypedDict):
+    asset: str
+    sku_id: str
+
+
 class Connection(TypedDict):
     id: str
     name: str
@@ -58,6 +63,7 @@ class User(TypedDict):
     id: str
     username: str
     discriminator: str
+    global_name: NotRequired[str | None]
     avatar: str | None
     bot: NotRequired[bool]
     system: NotRequired[bool]
@@ -70,6 +76,7 @@ class User(TypedDict):
     flags: NotRequired[UserFlag]
     premium_type: NotRequired[PremiumType]
     public_flags: NotRequired[UserFlag]
+    avatar_decoration_data: NotRequired[AvatarDecorationData | None]
 
 
 class UserFlag(IntFlag):